@@ -1,6 +1,9 @@
 resource "aws_api_gateway_rest_api" "api" {
   name        = "${var.apiname}-${var.environment}"
   description = var.apidescription
+
+  # Necessario para repassar os corpos comprimidos (isBase64Encoded) ao cliente
+  binary_media_types = ["*/*"]
 }
 
 resource "aws_api_gateway_resource" "customer_resource" {
@@ -53,6 +56,21 @@ resource "aws_api_gateway_model" "card_transaction_request_model" {
     },
     "NSU": {
       "type": "string"
+    },
+    "limit": {
+      "type": "string"
+    },
+    "cursor": {
+      "type": "string"
+    },
+    "since": {
+      "type": "string"
+    },
+    "summary": {
+      "type": "string"
+    },
+    "fields": {
+      "type": "string"
     }
   },
   "required": ["DataInicio", "DataFinal"]
@@ -92,7 +110,10 @@ resource "aws_api_gateway_model" "card_transaction_response_success_model" {
       }
     },
     "ret_cod": { "type": "integer" },
-    "ret_dsc": { "type": "string" }
+    "ret_dsc": { "type": "string" },
+    "next_cursor": { "type": ["string", "null"] },
+    "watermark": { "type": ["string", "null"] },
+    "Resumo": { "type": "object" }
   },
   "required": ["Transacoes", "ret_cod", "ret_dsc"]
 }
@@ -151,6 +172,11 @@ resource "aws_api_gateway_method" "card_transaction_method" {
     "method.request.querystring.DataInicio" = true
     "method.request.querystring.DataFinal"  = true
     "method.request.querystring.NSU"        = true
+    "method.request.querystring.limit"      = false
+    "method.request.querystring.cursor"     = false
+    "method.request.querystring.since"      = false
+    "method.request.querystring.summary"    = false
+    "method.request.querystring.fields"     = false
   }
 
   depends_on = [
@@ -201,6 +227,11 @@ resource "aws_api_gateway_integration" "card_transaction_integration" {
     "integration.request.querystring.DataInicio" = "method.request.querystring.DataInicio"
     "integration.request.querystring.DataFinal"  = "method.request.querystring.DataFinal"
     "integration.request.querystring.NSU"        = "method.request.querystring.NSU"
+    "integration.request.querystring.limit"      = "method.request.querystring.limit"
+    "integration.request.querystring.cursor"     = "method.request.querystring.cursor"
+    "integration.request.querystring.since"      = "method.request.querystring.since"
+    "integration.request.querystring.summary"    = "method.request.querystring.summary"
+    "integration.request.querystring.fields"     = "method.request.querystring.fields"
   }
 
   depends_on = [
@@ -281,6 +312,67 @@ resource "aws_api_gateway_integration" "get_exchange_integration" {
   uri                     = aws_lambda_function.exchange_handler.invoke_arn
 }
 
+resource "aws_api_gateway_resource" "convert_exchange_resource" {
+  rest_api_id = aws_api_gateway_rest_api.api.id
+  parent_id   = aws_api_gateway_resource.exchange_resource.id
+  path_part   = "convert"
+}
+
+resource "aws_api_gateway_method" "convert_exchange_method" {
+  rest_api_id   = aws_api_gateway_rest_api.api.id
+  resource_id   = aws_api_gateway_resource.convert_exchange_resource.id
+  http_method   = "POST"
+  authorization = "COGNITO_USER_POOLS"
+  authorizer_id = aws_api_gateway_authorizer.bf_integration_access_authorizer.id
+
+  depends_on = [
+    aws_api_gateway_authorizer.bf_integration_access_authorizer
+  ]
+}
+
+resource "aws_api_gateway_integration" "convert_exchange_integration" {
+  rest_api_id             = aws_api_gateway_rest_api.api.id
+  resource_id             = aws_api_gateway_resource.convert_exchange_resource.id
+  http_method             = aws_api_gateway_method.convert_exchange_method.http_method
+  integration_http_method = "POST"
+  type                    = "AWS_PROXY"
+  uri                     = aws_lambda_function.exchange_handler.invoke_arn
+}
+
+resource "aws_api_gateway_resource" "history_exchange_resource" {
+  rest_api_id = aws_api_gateway_rest_api.api.id
+  parent_id   = aws_api_gateway_resource.exchange_resource.id
+  path_part   = "history"
+}
+
+resource "aws_api_gateway_method" "history_exchange_method" {
+  rest_api_id   = aws_api_gateway_rest_api.api.id
+  resource_id   = aws_api_gateway_resource.history_exchange_resource.id
+  http_method   = "GET"
+  authorization = "COGNITO_USER_POOLS"
+  authorizer_id = aws_api_gateway_authorizer.bf_integration_access_authorizer.id
+
+  request_parameters = {
+    "method.request.querystring.Moeda"      = true
+    "method.request.querystring.DataInicio" = true
+    "method.request.querystring.DataFinal"  = true
+    "method.request.querystring.Intervalo"  = false
+  }
+
+  depends_on = [
+    aws_api_gateway_authorizer.bf_integration_access_authorizer
+  ]
+}
+
+resource "aws_api_gateway_integration" "history_exchange_integration" {
+  rest_api_id             = aws_api_gateway_rest_api.api.id
+  resource_id             = aws_api_gateway_resource.history_exchange_resource.id
+  http_method             = aws_api_gateway_method.history_exchange_method.http_method
+  integration_http_method = "POST"
+  type                    = "AWS_PROXY"
+  uri                     = aws_lambda_function.exchange_handler.invoke_arn
+}
+
 resource "aws_api_gateway_method" "auth_method" {
   rest_api_id   = aws_api_gateway_rest_api.api.id
   resource_id   = aws_api_gateway_resource.auth_resource.id
@@ -350,6 +442,38 @@ resource "aws_api_gateway_integration" "search_integration" {
 }
 
 
+resource "aws_api_gateway_resource" "batch_search_resource" {
+  rest_api_id = aws_api_gateway_rest_api.api.id
+  parent_id   = aws_api_gateway_resource.vigilante_resource.id
+  path_part   = "batch"
+}
+
+resource "aws_api_gateway_method" "batch_search_method" {
+  rest_api_id   = aws_api_gateway_rest_api.api.id
+  resource_id   = aws_api_gateway_resource.batch_search_resource.id
+  http_method   = "POST"
+  authorization = "COGNITO_USER_POOLS"
+  authorizer_id = aws_api_gateway_authorizer.bf_integration_access_authorizer.id
+
+  depends_on = [
+    aws_api_gateway_authorizer.bf_integration_access_authorizer
+  ]
+}
+
+resource "aws_api_gateway_integration" "batch_search_integration" {
+  rest_api_id             = aws_api_gateway_rest_api.api.id
+  resource_id             = aws_api_gateway_resource.batch_search_resource.id
+  http_method             = aws_api_gateway_method.batch_search_method.http_method
+  integration_http_method = "POST"
+  type                    = "AWS_PROXY"
+  uri                     = aws_lambda_function.watchman_handler.invoke_arn
+
+  depends_on = [
+    aws_api_gateway_method.batch_search_method
+  ]
+}
+
+
 resource "aws_api_gateway_method_response" "search_response_200" {
   rest_api_id = aws_api_gateway_rest_api.api.id
   resource_id = aws_api_gateway_resource.search_resource.id
@@ -392,8 +516,14 @@ resource "aws_api_gateway_deployment" "api_deployment" {
     aws_api_gateway_integration.auth_integration,
     aws_api_gateway_method.get_exchange_method,
     aws_api_gateway_integration.get_exchange_integration,
+    aws_api_gateway_method.convert_exchange_method,
+    aws_api_gateway_integration.convert_exchange_integration,
+    aws_api_gateway_method.history_exchange_method,
+    aws_api_gateway_integration.history_exchange_integration,
     aws_api_gateway_method.search_method,
     aws_api_gateway_integration.search_integration,
+    aws_api_gateway_method.batch_search_method,
+    aws_api_gateway_integration.batch_search_integration,
     aws_api_gateway_method_response.search_response_200,
     aws_api_gateway_integration_response.search_integration_response_200
   ]
@@ -119,6 +119,14 @@ resource "aws_lambda_permission" "allow_api_gateway_to_invoke_watchman" {
   
 }
 
+resource "aws_lambda_permission" "allow_events_to_invoke_exchange_refresher" {
+  statement_id  = "AllowEventsInvokeExchangeRefresher"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.exchange_refresher.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.exchange_refresher_schedule.arn
+}
+
 resource "aws_iam_policy" "lambda_logging_policy" {
   name        = "${var.apiname}-lambda_logging_policy-${var.environment}"
   description = "IAM policy for logging from a lambda"
@@ -153,3 +161,82 @@ resource "aws_iam_policy" "lambda_cognito_policy" {
     ]
   })
 }
+
+resource "aws_iam_policy" "lambda_transactions_cache_policy" {
+  count       = var.transactions_cache_table == "" ? 0 : 1
+  name        = "${var.apiname}-lambda_transactions_cache_policy-${var.environment}"
+  description = "IAM policy for the card transactions shared cache"
+  policy = jsonencode({
+    "Version": "2012-10-17",
+    "Statement": [
+      {
+        "Action": [
+          "dynamodb:GetItem",
+          "dynamodb:PutItem"
+        ],
+        "Effect": "Allow",
+        "Resource": "arn:aws:dynamodb:${var.region}:${data.aws_caller_identity.current.account_id}:table/${var.transactions_cache_table}"
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "attach_lambda_transactions_cache_policy" {
+  count      = var.transactions_cache_table == "" ? 0 : 1
+  role       = aws_iam_role.iam_for_lambda.name
+  policy_arn = aws_iam_policy.lambda_transactions_cache_policy[0].arn
+}
+
+resource "aws_iam_policy" "lambda_quotes_snapshot_policy" {
+  name        = "${var.apiname}-lambda_quotes_snapshot_policy-${var.environment}"
+  description = "IAM policy for the exchange quotes snapshot"
+  policy = jsonencode({
+    "Version": "2012-10-17",
+    "Statement": [
+      {
+        "Action": [
+          "s3:GetObject",
+          "s3:PutObject"
+        ],
+        "Effect": "Allow",
+        "Resource": "${aws_s3_bucket.quotes_snapshot.arn}/*"
+      },
+      {
+        "Action": [
+          "s3:ListBucket"
+        ],
+        "Effect": "Allow",
+        "Resource": aws_s3_bucket.quotes_snapshot.arn
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "attach_lambda_quotes_snapshot_policy" {
+  role       = aws_iam_role.iam_for_lambda.name
+  policy_arn = aws_iam_policy.lambda_quotes_snapshot_policy.arn
+}
+
+resource "aws_iam_policy" "lambda_watchman_prefilter_policy" {
+  count       = var.watchman_prefilter_bucket == "" ? 0 : 1
+  name        = "${var.apiname}-lambda_watchman_prefilter_policy-${var.environment}"
+  description = "IAM policy for the watchman prefilter snapshot"
+  policy = jsonencode({
+    "Version": "2012-10-17",
+    "Statement": [
+      {
+        "Action": [
+          "s3:GetObject"
+        ],
+        "Effect": "Allow",
+        "Resource": "arn:aws:s3:::${var.watchman_prefilter_bucket}/${var.watchman_prefilter_key}"
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "attach_lambda_watchman_prefilter_policy" {
+  count      = var.watchman_prefilter_bucket == "" ? 0 : 1
+  role       = aws_iam_role.iam_for_lambda.name
+  policy_arn = aws_iam_policy.lambda_watchman_prefilter_policy[0].arn
+}
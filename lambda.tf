@@ -1,3 +1,9 @@
+resource "aws_lambda_layer_version" "shared_layer" {
+  layer_name          = "bf_shared-${var.environment}"
+  filename            = "lambdas/shared.zip"
+  compatible_runtimes = ["python3.10"]
+}
+
 resource "aws_cloudwatch_log_group" "watchman_handler_log_group" {
   name              = "/aws/lambda/watchman_handler-${var.environment}"
   retention_in_days = 14
@@ -11,6 +17,14 @@ resource "aws_lambda_function" "watchman_handler" {
   timeout       = 30
 
   filename = "lambdas/watchman_handler.zip"
+  layers   = [aws_lambda_layer_version.shared_layer.arn]
+
+  environment {
+    variables = {
+      WATCHMAN_PREFILTER_BUCKET = var.watchman_prefilter_bucket
+      WATCHMAN_PREFILTER_KEY    = var.watchman_prefilter_key
+    }
+  }
 
   vpc_config {
     subnet_ids         = [
@@ -36,11 +50,13 @@ resource "aws_lambda_function" "card_transactions_handler" {
   timeout       = 30
 
   filename = "lambdas/card_transactions_handler.zip"
+  layers   = [aws_lambda_layer_version.shared_layer.arn]
   
   environment {
     variables = {
-      GX_CLIENT_ID   = var.gx_client_id
-      LOG_GROUP_NAME = aws_cloudwatch_log_group.card_transactions_handler_log_group.name
+      GX_CLIENT_ID             = var.gx_client_id
+      LOG_GROUP_NAME           = aws_cloudwatch_log_group.card_transactions_handler_log_group.name
+      TRANSACTIONS_CACHE_TABLE = var.transactions_cache_table
     }
   }
 }
@@ -58,6 +74,7 @@ resource "aws_lambda_function" "accreditation_handler" {
   timeout       = 30
 
   filename = "lambdas/accreditation_handler.zip"
+  layers   = [aws_lambda_layer_version.shared_layer.arn]
   
   environment {
     variables = {
@@ -80,14 +97,55 @@ resource "aws_lambda_function" "exchange_handler" {
   timeout       = 30
 
   filename = "lambdas/exchange_handler.zip"
+  layers   = [aws_lambda_layer_version.shared_layer.arn]
   
   environment {
     variables = {
-      LOG_GROUP_NAME = aws_cloudwatch_log_group.exchange_handler_log_group.name
+      LOG_GROUP_NAME         = aws_cloudwatch_log_group.exchange_handler_log_group.name
+      QUOTES_SNAPSHOT_BUCKET = aws_s3_bucket.quotes_snapshot.bucket
+      QUOTES_HISTORY_BUCKET  = aws_s3_bucket.quotes_snapshot.bucket
+    }
+  }
+}
+
+resource "aws_s3_bucket" "quotes_snapshot" {
+  bucket = "${var.apiname}-quotes-${var.environment}"
+}
+
+resource "aws_cloudwatch_log_group" "exchange_refresher_log_group" {
+  name              = "/aws/lambda/exchange_refresher-${var.environment}"
+  retention_in_days = 14
+}
+
+resource "aws_lambda_function" "exchange_refresher" {
+  function_name = "exchange_refresher-${var.environment}"
+  runtime       = "python3.10"
+  handler       = "exchange_handler.refresh_handler"
+  role          = aws_iam_role.iam_for_lambda.arn
+  timeout       = 30
+
+  filename = "lambdas/exchange_handler.zip"
+  layers   = [aws_lambda_layer_version.shared_layer.arn]
+
+  environment {
+    variables = {
+      LOG_GROUP_NAME         = aws_cloudwatch_log_group.exchange_refresher_log_group.name
+      QUOTES_SNAPSHOT_BUCKET = aws_s3_bucket.quotes_snapshot.bucket
+      QUOTES_HISTORY_BUCKET  = aws_s3_bucket.quotes_snapshot.bucket
     }
   }
 }
 
+resource "aws_cloudwatch_event_rule" "exchange_refresher_schedule" {
+  name                = "exchange_refresher-${var.environment}"
+  schedule_expression = "rate(1 minute)"
+}
+
+resource "aws_cloudwatch_event_target" "exchange_refresher_target" {
+  rule = aws_cloudwatch_event_rule.exchange_refresher_schedule.name
+  arn  = aws_lambda_function.exchange_refresher.arn
+}
+
 resource "aws_cloudwatch_log_group" "integration_access_auth_handler_log_group" {
   name              = "/aws/lambda/integration_access_auth_handler-${var.environment}"
   retention_in_days = 14
@@ -101,6 +159,7 @@ resource "aws_lambda_function" "integration_access_auth_handler" {
   timeout       = 30
 
   filename = "lambdas/integration_access_auth_handler.zip"
+  layers   = [aws_lambda_layer_version.shared_layer.arn]
   environment {
     variables = {
       COGNITO_USER_POOL_ID = var.cognito_user_pool_id
@@ -1,30 +1,30 @@
 import json
 import os
-import requests
-import jwt
 import logging
+from bf_shared.request_context import claim, request_body
+from bf_shared.deadline import Deadline, DeadlineExceeded, gateway_timeout
+from bf_shared.response import compressed
+from bf_shared import upstream
+from bf_shared.upstream import UpstreamResponse, ret_cod_status
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Pool de conexoes criado na inicializacao e reaproveitado entre invocacoes quentes
+retaguarda = upstream.client('retaguarda')
+
+@compressed
 def lambda_handler(event, context):
     logger.info('Inicio do evento do retaguarda - credenciamento')
     try:
-        token: str = event['headers']['Authorization'].replace(' Bearer ', '')
-        token: str = token.replace('Bearer ', '')
         gx_client_id: str = os.environ['GX_CLIENT_ID']
 
+        # Claims ja validadas pelo autorizador do API Gateway
+        api_key: str = claim(event, 'ApiKey')
+        est_cpf_cnpj: str = claim(event, 'EstCpfCnpj')
 
-        logger.info('Inicio da decodificacao do token')
-        # Valide o token JWT e extraia os dados necessários
-        decoded_token: dict = jwt.decode(token, options={"verify_signature": False}, algorithms=["HS256"])
-
-        
-        api_key: str = decoded_token.get('custom:ApiKey')
-        est_cpf_cnpj: str = decoded_token.get('custom:EstCpfCnpj')
-
-        logger.info(f'fim da decodificacao do token, cliente identificado: {est_cpf_cnpj}')
+        logger.info(f'cliente identificado: {est_cpf_cnpj}')
 
-        body_parameters: dict = event.get('body', {})
+        body_parameters: dict = request_body(event)
         
         
         logger.info(f'Pegou o body {json.dumps(body_parameters)}')
@@ -57,33 +57,36 @@ def lambda_handler(event, context):
         }
 
 
-        response = requests.post(
+        # Cadastro nao e idempotente: uma unica tentativa, limitada ao prazo da invocacao
+        response = Deadline(context).call(lambda timeout: retaguarda.post(
             'https://sistema.qa.bemfacil.digital/bemfacilev15/rest/api_cadastrar_estabelecimento',
             headers=headers,
             data=json.dumps(payload),
-            verify=False
-        )
+            verify=False,
+            timeout=timeout
+        ), attempts=1)
 
         logger.info(f'Evento finalizado')
-        ret_cod = response.json().get('ret_cod', 0)
+        result = UpstreamResponse.from_response(response)
+        ret_cod = result.ret_cod
         if ret_cod:
             if ret_cod == 6:
                 logger.error('Registro não encontrado')
-                return {
-                    'statusCode': 404,
-                    'body': json.dumps(response.json())
-                }
-            logger.error(f'Erro encontrado no retaguarda {json.dumps(response.json())}')
+            else:
+                logger.error(f'Erro encontrado no retaguarda {result.text}')
             return {
-                'statusCode': 400,
-                'body': json.dumps(response.json())
+                'statusCode': ret_cod_status(ret_cod),
+                'body': result.text
             }
-        logger.info(response.json())
+        logger.info(result.text)
         logger.info(f'Consulta realizada com sucesso')
         return {
             'statusCode': 200,
-            'body': json.dumps(response.json())
+            'body': result.text
         }
+    except DeadlineExceeded as e:
+        logger.error(f'Tempo limite do upstream excedido: {str(e)}')
+        return gateway_timeout()
     except Exception as e:
         logger.error(f'erro encontrado no handler: {str(e)}')
         return {
@@ -1,2 +0,0 @@
-class RemovedInPyjwt3Warning(DeprecationWarning):
-    pass
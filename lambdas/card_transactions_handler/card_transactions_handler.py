@@ -1,28 +1,75 @@
 import json
 import os
-import requests
-import jwt
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib3.exceptions import ReadTimeoutError
+from bf_shared.deadline import Deadline, DeadlineExceeded, gateway_timeout
+from bf_shared import etag
+from bf_shared.json_stream import encode_object
+from bf_shared.request_context import claim, header
+from bf_shared.response import compressed
+from bf_shared import upstream
+from bf_shared.upstream import ret_cod_status
+import transactions_cache
+import transactions_columnar
+import transactions_fanout
+import transactions_pagination
+import transactions_projection
+import transactions_summary
+import transactions_watermark
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Criados na inicializacao para serem reaproveitados entre invocacoes quentes
+cache = transactions_cache.from_environment()
+retaguarda = upstream.client('retaguarda', pool_maxsize=max(transactions_fanout.MAX_WORKERS, upstream.POOL_MAXSIZE))
+
+
+def fetch_transactions(payload: dict, headers: dict, deadline: Deadline) -> transactions_cache.TransactionsResponse:
+    key: str = transactions_cache.cache_key(
+        payload['ApiKey'], payload['EstCpfCnpj'], payload['DataInicio'], payload['DataFinal'], payload['NSU']
+    )
+    result: transactions_cache.TransactionsResponse = cache.get(key)
+    if result is not None:
+        logger.info(f'Consulta {payload["DataInicio"]}-{payload["DataFinal"]} atendida pelo cache')
+        return result
+
+    logger.info(f'Inicio do request para o retaguarda {payload["DataInicio"]}-{payload["DataFinal"]}')
+    # Consulta sem efeito colateral: pode ser repetida dentro do prazo da invocacao
+    with deadline.call(lambda timeout: retaguarda.post(
+        'https://sistema.bemfacil.digital/bemfacil/rest/api_transacoes_realtime',
+        headers=headers,
+        data=json.dumps(payload),
+        stream=True,
+        timeout=timeout
+    )) as response:
+        try:
+            # O prazo vale para o corpo inteiro, nao so para cada leitura do socket
+            with deadline.guard(response):
+                result = transactions_cache.TransactionsResponse.from_stream(response)
+        except ReadTimeoutError as e:
+            raise DeadlineExceeded(f'Upstream nao respondeu dentro do prazo: {str(e)}') from e
+
+    if result.ret_cod in transactions_cache.CACHEABLE_RET_CODS:
+        cache.set(
+            key,
+            result,
+            transactions_cache.ttl_for_range(payload['DataInicio'], payload['DataFinal'])
+        )
+    return result
+
+
+@compressed
 def lambda_handler(event, context):
     logger.info('Inicio do evento do retaguarda transacoes')
     try:
-        token: str = event['headers']['Authorization'].replace(' Bearer ', '')
-        token: str = token.replace('Bearer ', '')
         gx_client_id: str = os.environ['GX_CLIENT_ID']
 
+        # Claims ja validadas pelo autorizador do API Gateway
+        api_key: str = claim(event, 'ApiKey')
+        est_cpf_cnpj: str = claim(event, 'EstCpfCnpj')
 
-        logger.info('Inicio da decodificacao do token')
-        # Valide o token JWT e extraia os dados necessários
-        decoded_token: dict = jwt.decode(token, options={"verify_signature": False}, algorithms=["HS256"])
-
-        
-        api_key: str = decoded_token.get('custom:ApiKey')
-        est_cpf_cnpj: str = decoded_token.get('custom:EstCpfCnpj')
-
-        logger.info(f'fim da decodificacao do token, cliente identificado: {est_cpf_cnpj}')
+        logger.info(f'cliente identificado: {est_cpf_cnpj}')
 
         query_string_parameters: dict = event.get('queryStringParameters', {})
         
@@ -45,40 +92,144 @@ def lambda_handler(event, context):
             "DataFinal": query_string_parameters.get('DataFinal', ''),
             "NSU": query_string_parameters.get('NSU', '')
         }
-                
-        logger.info(f'Inicio do request para o retaguarda')
 
+        # Paginacao opcional: o cursor carrega a janela da consulta original
+        limit: int = None
+        cursor: dict = None
+        if query_string_parameters.get('limit') or query_string_parameters.get('cursor'):
+            limit = transactions_pagination.parse_limit(
+                query_string_parameters.get('limit', transactions_pagination.MAX_LIMIT)
+            )
+        if query_string_parameters.get('cursor'):
+            cursor = transactions_pagination.decode_cursor(query_string_parameters['cursor'])
+            payload['DataInicio'] = cursor['i']
+            payload['DataFinal'] = cursor['f']
+            payload['NSU'] = cursor['n']
+
+        # Sincronizacao incremental: so devolve transacoes posteriores ao watermark
+        since_parameter: str = cursor.get('w') if cursor else query_string_parameters.get('since')
+        since: tuple = transactions_watermark.decode_watermark(since_parameter) if since_parameter else None
+
+        # Projecao opcional dos campos de cada transacao
+        fields: tuple = None
+        if query_string_parameters.get('fields'):
+            fields = transactions_projection.parse_fields(query_string_parameters['fields'])
+                
         headers = {
             'Content-Type': 'application/json',
             'Cookie': f'GX_CLIENT_ID={gx_client_id}'
         }
+        deadline = Deadline(context)
 
-
-        response = requests.post(
-            'https://sistema.bemfacil.digital/bemfacil/rest/api_transacoes_realtime',
-            headers=headers,
-            data=json.dumps(payload)
-        )
+        # Intervalos longos viram varias consultas menores feitas em paralelo
+        windows: list = transactions_fanout.split_range(payload['DataInicio'], payload['DataFinal'])
+        if len(windows) == 1:
+            result: transactions_cache.TransactionsResponse = fetch_transactions(payload, headers, deadline)
+        else:
+            logger.info(f'Consulta dividida em {len(windows)} janelas')
+            with ThreadPoolExecutor(max_workers=min(len(windows), transactions_fanout.MAX_WORKERS)) as executor:
+                responses: list = list(executor.map(
+                    lambda window: fetch_transactions(
+                        {**payload, 'DataInicio': window[0], 'DataFinal': window[1]}, headers, deadline
+                    ),
+                    windows
+                ))
+            result: transactions_cache.TransactionsResponse = transactions_fanout.merge_responses(responses, windows)
 
         logger.info(f'Evento finalizado')
-        ret_cod = response.json().get('ret_cod', 0)
+        ret_cod: int = result.ret_cod
         if ret_cod:
             if ret_cod == 6:
                 logger.error('Registro não encontrado')
-                return {
-                    'statusCode': 404,
-                    'body': json.dumps(response.json())
-                }
-            logger.error(f'Erro encontrado no retaguarda {json.dumps(response.json())}')
+            else:
+                logger.error(f'Erro encontrado no retaguarda {result.text}')
             return {
-                'statusCode': 400,
-                'body': json.dumps(response.json())
-            }    
+                'statusCode': ret_cod_status(ret_cod),
+                'body': result.text
+            }
         logger.info(f'Consulta realizada com sucesso')
-        return {
+
+        accept_columnar: bool = transactions_columnar.accepts(header(event, 'Accept'))
+        summary: bool = query_string_parameters.get('summary', '').lower() in ('true', '1')
+
+        # Dias fechados nao mudam: a etag sai da resposta em cache e dos parametros
+        # que alteram a representacao, sem serializar nada
+        response_etag: str = None
+        if transactions_cache.ttl_for_range(payload['DataInicio'], payload['DataFinal']) == transactions_cache.TTL_CLOSED:
+            response_etag = etag.strong_etag(
+                result.etag, since_parameter, limit, query_string_parameters.get('cursor'),
+                fields, summary, accept_columnar
+            )
+            matched_etag: str = etag.matches(event, response_etag)
+            if matched_etag:
+                logger.info('Transacoes nao modificadas, respondendo 304')
+                return etag.not_modified(matched_etag)
+
+        if not (since or limit or fields or summary or accept_columnar):
+            # Sem transformacao: repassa os bytes do retaguarda acrescentando so o watermark
+            return etag.with_etag({
+                'statusCode': 200,
+                'body': transactions_watermark.with_watermark(result.content, result.newest)
+            }, response_etag)
+
+        # Transformacoes leem as transacoes em stream dos bytes guardados e codificam
+        # uma por vez; a arvore do corpo inteiro nunca e montada
+        stream = transactions_fanout.window_stream(result, windows, 'Transacoes')
+        transacoes = transactions_watermark.after(stream, since)
+        newest: tuple = max(filter(None, (since, result.newest)), default=None)
+        extra: dict = {'watermark': transactions_watermark.encode_watermark(newest) if newest else None}
+        if summary:
+            # Resumo agregado no lugar da lista completa de transacoes
+            resumo: dict = transactions_summary.summarize(transacoes)
+            return etag.with_etag({
+                'statusCode': 200,
+                'body': json.dumps({
+                    'ret_cod': stream.fields.get('ret_cod', 0),
+                    'ret_dsc': stream.fields.get('ret_dsc', ''),
+                    'Resumo': resumo,
+                    **extra
+                }, ensure_ascii=False)
+            }, response_etag)
+        if limit:
+            page, has_more, window = transactions_pagination.paginate(stream, transacoes, limit, cursor)
+            # O resto do corpo e lido sem guardar nada, so pelos campos depois do array
+            for _ in transacoes:
+                pass
+            extra['next_cursor'] = transactions_pagination.encode_cursor(
+                payload['DataInicio'], payload['DataFinal'], payload['NSU'], window, page[-1], since_parameter
+            ) if has_more else None
+            transacoes = page
+        if accept_columnar:
+            columns: dict = transactions_columnar.to_columns(transacoes, fields or transactions_projection.FIELDS)
+            return etag.with_etag({
+                'statusCode': 200,
+                'headers': {'Content-Type': transactions_columnar.CONTENT_TYPE},
+                'body': json.dumps({**stream.fields, **extra, **columns}, ensure_ascii=False)
+            }, response_etag)
+        if fields:
+            transacoes = transactions_projection.project(transacoes, fields)
+        # Consome o stream inteiro antes de montar o objeto com os demais campos
+        array_text: str = ', '.join(json.dumps(transacao, ensure_ascii=False) for transacao in transacoes)
+        return etag.with_etag({
             'statusCode': 200,
-            'body': json.dumps(response.json())
+            'body': encode_object({**stream.fields, **extra}, 'Transacoes', array_text, stream.array_index)
+        }, response_etag)
+    except (
+        transactions_pagination.InvalidPageRequest,
+        transactions_watermark.InvalidWatermark,
+        transactions_projection.InvalidFields
+    ) as e:
+        logger.error(f'Parametros de consulta invalidos: {str(e)}')
+        return {
+            'statusCode': 400,
+            'body': json.dumps({
+                "ret_cod": 5,
+                "ret_dsc": str(e)
+            })
         }
+    except DeadlineExceeded as e:
+        logger.error(f'Tempo limite do upstream excedido: {str(e)}')
+        return gateway_timeout()
     except Exception as e:
         logger.error(f'erro encontrado no handler: {str(e)}')
         return {
@@ -0,0 +1,128 @@
+import hashlib
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from functools import cached_property
+
+from bf_shared.ttl_cache import TTLCache
+from bf_shared.upstream import UpstreamResponse
+
+import transactions_watermark
+
+logger = logging.getLogger()
+
+# O retaguarda trabalha no horario de Brasilia (sem horario de verao desde 2019)
+BRT = timezone(timedelta(hours=-3))
+
+TTL_TODAY: int = int(os.environ.get('TRANSACTIONS_CACHE_TTL_TODAY', '30'))
+TTL_CLOSED: int = int(os.environ.get('TRANSACTIONS_CACHE_TTL_CLOSED', '86400'))
+MAX_ENTRIES: int = int(os.environ.get('TRANSACTIONS_CACHE_MAX_ENTRIES', '64'))
+# Soma dos corpos guardados no container; a funcao roda com 128 MB
+MAX_BYTES: int = int(os.environ.get('TRANSACTIONS_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+# Itens do DynamoDB tem no maximo 400 KB contando chave e nomes de atributos;
+# corpos maiores ficam so no cache local
+ITEM_MAX_BYTES: int = int(os.environ.get('TRANSACTIONS_CACHE_ITEM_MAX_BYTES', str(350 * 1024)))
+
+# ret_cod 0 (sucesso) e 6 (registro nao encontrado) sao respostas estaveis;
+# erros do retaguarda nunca vao para o cache
+CACHEABLE_RET_CODS = (0, 6)
+
+
+class TransactionsResponse(UpstreamResponse):
+    # Resposta do api_transacoes_realtime guardada no cache so com os bytes
+    # originais; valores derivados do corpo sao calculados uma vez por entrada,
+    # lendo as transacoes em stream, e nao por requisicao
+
+    @cached_property
+    def newest(self) -> tuple:
+        return transactions_watermark.newest_key(self.stream('Transacoes'))
+
+
+def today() -> str:
+    return datetime.now(BRT).strftime('%Y%m%d')
+
+
+def cache_key(api_key: str, est_cpf_cnpj: str, data_inicio: str, data_final: str, nsu: str) -> str:
+    # O retaguarda valida a ApiKey: uma ApiKey revogada ou errada nunca recebe a
+    # resposta guardada para outra. Vai so o hash, a chave aparece nos logs e no DynamoDB.
+    api_key_hash: str = hashlib.sha256((api_key or '').encode()).hexdigest()
+    return '|'.join((api_key_hash, est_cpf_cnpj or '', data_inicio or '', data_final or '', nsu or ''))
+
+
+def ttl_for_range(data_inicio: str, data_final: str) -> int:
+    # Dias ja fechados nao mudam mais; intervalos que incluem hoje ainda recebem transacoes
+    if not data_final or data_final >= today():
+        return TTL_TODAY
+    return TTL_CLOSED
+
+
+class DynamoCacheBackend:
+    # Backend compartilhado opcional entre containers. A tabela usa CacheKey como
+    # chave de particao e ExpiresAt como atributo de TTL do DynamoDB.
+
+    def __init__(self, table_name: str, item_max_bytes: int = ITEM_MAX_BYTES):
+        import boto3
+        self.table_name = table_name
+        self.item_max_bytes = item_max_bytes
+        self.client = boto3.client('dynamodb')
+
+    def get(self, key: str):
+        item = self.client.get_item(
+            TableName=self.table_name,
+            Key={'CacheKey': {'S': key}}
+        ).get('Item')
+        if not item:
+            return None, 0
+        ttl = int(item['ExpiresAt']['N']) - time.time()
+        if ttl <= 0:
+            return None, 0
+        return TransactionsResponse(content=item['Body']['S'].encode()), ttl
+
+    def set(self, key: str, value, ttl: float):
+        if len(value.content) > self.item_max_bytes:
+            logger.info(f'Resposta de {len(value.content)} bytes fora do cache compartilhado: {key}')
+            return
+        self.client.put_item(
+            TableName=self.table_name,
+            Item={
+                'CacheKey': {'S': key},
+                'Body': {'S': value.text},
+                'ExpiresAt': {'N': str(int(time.time() + ttl))}
+            }
+        )
+
+
+class TransactionsCache:
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES, backend=None):
+        self.local = TTLCache(max_entries, max_bytes)
+        self.backend = backend
+
+    def get(self, key: str):
+        value = self.local.get(key)
+        if value is not None or self.backend is None:
+            return value
+        try:
+            value, ttl = self.backend.get(key)
+        except Exception as e:
+            logger.error(f'erro ao consultar o cache compartilhado: {str(e)}')
+            return None
+        if value is not None:
+            self.local.set(key, value, ttl, len(value.content))
+        return value
+
+    def set(self, key: str, value, ttl: float):
+        self.local.set(key, value, ttl, len(value.content))
+        if self.backend is None:
+            return
+        try:
+            self.backend.set(key, value, ttl)
+        except Exception as e:
+            logger.error(f'erro ao gravar no cache compartilhado: {str(e)}')
+
+
+def from_environment() -> TransactionsCache:
+    table_name: str = os.environ.get('TRANSACTIONS_CACHE_TABLE', '')
+    backend = DynamoCacheBackend(table_name) if table_name else None
+    return TransactionsCache(backend=backend)
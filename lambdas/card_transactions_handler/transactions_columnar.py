@@ -0,0 +1,20 @@
+CONTENT_TYPE = 'application/vnd.bf.columnar+json'
+
+
+def accepts(accept: str) -> bool:
+    # Formato colunar so e usado quando pedido explicitamente no Accept
+    media_types = (media_type.split(';')[0].strip().lower() for media_type in (accept or '').split(','))
+    return CONTENT_TYPE in media_types
+
+
+def to_columns(transacoes, columns: tuple) -> dict:
+    # Os nomes dos campos aparecem uma unica vez em vez de uma vez por transacao.
+    # Uma passada so: cada transacao e distribuida pelas colunas e descartada.
+    data: dict = {column: [] for column in columns}
+    for transacao in transacoes:
+        for column in columns:
+            data[column].append(transacao.get(column))
+    return {
+        'columns': list(columns),
+        'data': data
+    }
@@ -0,0 +1,123 @@
+import os
+from datetime import datetime, timedelta
+from functools import cached_property
+
+from bf_shared.etag import strong_etag
+from bf_shared.json_stream import encode_object
+
+from transactions_cache import TransactionsResponse
+
+# Tamanho de cada sub-janela em dias (0 desativa o fan-out) e limite de requests simultaneos
+WINDOW_DAYS: int = int(os.environ.get('TRANSACTIONS_FANOUT_WINDOW_DAYS', '1'))
+MAX_WORKERS: int = int(os.environ.get('TRANSACTIONS_FANOUT_MAX_WORKERS', '8'))
+
+DATE_FORMAT = '%Y%m%d'
+
+
+def split_range(data_inicio: str, data_final: str, window_days: int = WINDOW_DAYS) -> list:
+    # Datas invalidas ou intervalo invertido seguem intactos para o retaguarda validar
+    if window_days <= 0:
+        return [(data_inicio, data_final)]
+    try:
+        start = datetime.strptime(data_inicio, DATE_FORMAT)
+        end = datetime.strptime(data_final, DATE_FORMAT)
+    except (TypeError, ValueError):
+        return [(data_inicio, data_final)]
+    if end < start:
+        return [(data_inicio, data_final)]
+
+    windows = []
+    while start <= end:
+        window_end = min(start + timedelta(days=window_days - 1), end)
+        windows.append((start.strftime(DATE_FORMAT), window_end.strftime(DATE_FORMAT)))
+        start = window_end + timedelta(days=1)
+    return windows
+
+
+class ChainedStream:
+    # Transacoes das janelas em sequencia. window guarda a janela (DataInicio) da
+    # ultima transacao entregue, e seek pula direto para uma janela sem ler as
+    # anteriores; os demais campos vem da primeira janela lida.
+
+    def __init__(self, streams: list, windows: list):
+        self.streams = streams
+        self.windows = windows
+        self.start: int = 0
+        self.window: str = None
+
+    @property
+    def fields(self) -> dict:
+        return self.streams[self.start].fields
+
+    @property
+    def array_index(self) -> int:
+        return self.streams[self.start].array_index
+
+    def seek(self, window: str) -> bool:
+        if window not in self.windows:
+            return False
+        self.start = self.windows.index(window)
+        return True
+
+    def __iter__(self):
+        for window, stream in zip(self.windows[self.start:], self.streams[self.start:]):
+            for transacao in stream:
+                self.window = window
+                yield transacao
+
+
+class MergedResponse(TransactionsResponse):
+    # Janelas combinadas sem montar um corpo novo: as transacoes sao lidas dos
+    # bytes guardados de cada janela. O corpo combinado so e montado quando a
+    # consulta e repassada sem transformacao, com o texto original de cada transacao.
+
+    def __init__(self, responses: list, windows: list):
+        super().__init__()
+        self.responses = responses
+        self.windows = windows
+
+    def stream(self, array_key: str, raw: bool = False) -> ChainedStream:
+        return ChainedStream([response.stream(array_key, raw) for response in self.responses], self.windows)
+
+    @property
+    def content(self) -> bytes:
+        if self._content is None:
+            stream = self.stream('Transacoes', raw=True)
+            transacoes: str = ', '.join(stream)
+            self._content = encode_object(stream.fields, 'Transacoes', transacoes, stream.array_index).encode()
+        return self._content
+
+    @property
+    def ret_cod(self) -> int:
+        # So janelas com ret_cod 0 entram na combinacao
+        return 0
+
+    @cached_property
+    def newest(self) -> tuple:
+        keys: list = [response.newest for response in self.responses if response.newest]
+        return max(keys) if keys else None
+
+
+def window_stream(result: TransactionsResponse, windows: list, array_key: str) -> ChainedStream:
+    # Stream com a janela de cada transacao, para o cursor de paginacao
+    if isinstance(result, MergedResponse):
+        return result.stream(array_key)
+    return ChainedStream([result.stream(array_key)], [windows[0][0]])
+
+
+def merge_responses(responses: list, windows: list) -> TransactionsResponse:
+    # Respostas na ordem cronologica das sub-janelas (windows, de split_range).
+    # Qualquer erro do retaguarda vence; se todas forem ret_cod 6 a consulta
+    # inteira e "nao encontrado".
+    for response in responses:
+        if response.ret_cod not in (0, 6):
+            return response
+
+    found = [(response, window[0]) for response, window in zip(responses, windows) if not response.ret_cod]
+    if not found:
+        return responses[0]
+
+    result = MergedResponse([response for response, _ in found], [window for _, window in found])
+    # Etag derivada das etags das janelas, sem serializar o corpo combinado
+    result.etag = strong_etag(*(response.etag for response in responses))
+    return result
@@ -0,0 +1,74 @@
+import base64
+import binascii
+import json
+import os
+from itertools import islice
+
+MAX_LIMIT: int = int(os.environ.get('TRANSACTIONS_MAX_PAGE_SIZE', '1000'))
+
+
+class InvalidPageRequest(ValueError):
+    pass
+
+
+def encode_cursor(data_inicio: str, data_final: str, nsu: str, window: str, transacao: dict, since: str = None) -> str:
+    # A posicao e a janela do fan-out (DataInicio do dia) e o par VanTrnSeq/VanTrnNsu
+    # da ultima transacao entregue; a sequencia so e unica dentro de cada janela
+    cursor: dict = {
+        'i': data_inicio,
+        'f': data_final,
+        'n': nsu,
+        'd': window,
+        's': transacao.get('VanTrnSeq'),
+        'u': transacao.get('VanTrnNsu')
+    }
+    if since:
+        cursor['w'] = since
+    raw: bytes = json.dumps(cursor, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        raw: bytes = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        decoded = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise InvalidPageRequest('Cursor inválido')
+    if not isinstance(decoded, dict) or not {'i', 'f', 'n', 'd', 's', 'u'} <= decoded.keys():
+        raise InvalidPageRequest('Cursor inválido')
+    return decoded
+
+
+def parse_limit(limit: str) -> int:
+    try:
+        value = int(limit)
+    except (TypeError, ValueError):
+        raise InvalidPageRequest('Limite inválido')
+    if value <= 0:
+        raise InvalidPageRequest('Limite inválido')
+    return min(value, MAX_LIMIT)
+
+
+def paginate(stream, transacoes, limit: int, cursor: dict = None) -> tuple:
+    # Retorna a pagina, se ainda existem transacoes depois dela e a janela da
+    # ultima transacao da pagina. transacoes sao lidas de stream (um
+    # transactions_fanout.ChainedStream, talvez filtrado), que informa a janela de
+    # cada uma. Com cursor, as janelas anteriores sao puladas e a posicao e
+    # localizada pela ultima transacao entregue, so dentro da janela do cursor;
+    # novas transacoes no fim do dia nao deslocam as paginas seguintes. Consome as
+    # transacoes so ate uma depois da pagina.
+    if cursor is not None and not stream.seek(cursor['d']):
+        raise InvalidPageRequest('Cursor inválido')
+    rows = iter(transacoes)
+    if cursor is not None:
+        for transacao in rows:
+            if stream.window != cursor['d']:
+                raise InvalidPageRequest('Cursor inválido')
+            if transacao.get('VanTrnSeq') == cursor['s'] and transacao.get('VanTrnNsu') == cursor['u']:
+                break
+        else:
+            raise InvalidPageRequest('Cursor inválido')
+
+    page: list = list(islice(rows, limit))
+    window: str = stream.window
+    return page, next(rows, None) is not None, window
@@ -0,0 +1,35 @@
+# Campos do CardTransactionResponseSuccessModel aceitos em fields=
+FIELDS = (
+    'EstNomFan',
+    'VanTrnCodDsc',
+    'VanTrnDta',
+    'VanTrnHraFor',
+    'VanTrnNsu',
+    'VanTrnNsuOri',
+    'VanTrnNumAtz',
+    'VanTrnPosNumSer',
+    'VanTrnQtdPar',
+    'VanTrnSeq',
+    'VanTrnStsDsc',
+    'VanTrnTipPrdDsc',
+    'VanTrnVlr',
+)
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+def parse_fields(fields: str) -> tuple:
+    requested: tuple = tuple(dict.fromkeys(field.strip() for field in fields.split(',') if field.strip()))
+    unknown: list = [field for field in requested if field not in FIELDS]
+    if not requested or unknown:
+        raise InvalidFields(f'Campos inválidos: {", ".join(unknown)}')
+    return requested
+
+
+def project(transacoes, fields: tuple):
+    return (
+        {field: transacao[field] for field in fields if field in transacao}
+        for transacao in transacoes
+    )
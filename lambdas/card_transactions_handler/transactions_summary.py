@@ -0,0 +1,79 @@
+import re
+from array import array
+from decimal import Decimal, InvalidOperation
+
+# Dimensoes de agrupamento do resumo: nome no corpo de resposta -> campo da transacao
+DIMENSIONS = (
+    ('PorProduto', 'VanTrnTipPrdDsc'),
+    ('PorStatus', 'VanTrnStsDsc'),
+    ('PorDia', 'VanTrnDta'),
+    ('PorParcelas', 'VanTrnQtdPar'),
+)
+
+# Sem virgula, pontos em grupos de 3 digitos sao separador de milhar (1.234 e 1.234.567);
+# um unico ponto seguido de ate 2 digitos e ponto decimal (1234.5, 1234.56)
+THOUSANDS_ONLY = re.compile(r'^[+-]?\d{1,3}(\.\d{3})+$')
+
+
+class InvalidAmount(ValueError):
+    pass
+
+
+def parse_cents(valor) -> int:
+    # VanTrnVlr chega como texto, no formato brasileiro (1.234,56) ou com ponto decimal
+    if valor is None or valor == '':
+        return 0
+    text: str = str(valor).strip().replace(' ', '')
+    if ',' in text or THOUSANDS_ONLY.match(text):
+        text = text.replace('.', '').replace(',', '.')
+    try:
+        value = Decimal(text)
+    except InvalidOperation:
+        raise InvalidAmount(f'Valor de transacao invalido: {valor}')
+    if not value.is_finite():
+        raise InvalidAmount(f'Valor de transacao invalido: {valor}')
+    return int((value * 100).to_integral_value())
+
+
+def format_cents(cents: int) -> str:
+    sign: str = '-' if cents < 0 else ''
+    cents = abs(cents)
+    return f'{sign}{cents // 100}.{cents % 100:02d}'
+
+
+def summarize(transacoes) -> dict:
+    # Coluna de valores em centavos inteiros (soma exata) e uma coluna de codigos
+    # por dimensao, preenchidas numa passada so sobre as transacoes; os totais
+    # saem de uma passada sobre as colunas.
+    # Valores ilegiveis nao derrubam o resumo: a transacao conta na quantidade,
+    # fica fora das somas e aparece em ValoresInvalidos
+    valores = array('q')
+    invalid: int = 0
+    labels: dict = {name: {} for name, _ in DIMENSIONS}
+    codes: dict = {name: array('l') for name, _ in DIMENSIONS}
+    for transacao in transacoes:
+        try:
+            valores.append(parse_cents(transacao.get('VanTrnVlr')))
+        except InvalidAmount:
+            valores.append(0)
+            invalid += 1
+        for name, field in DIMENSIONS:
+            dimension: dict = labels[name]
+            codes[name].append(dimension.setdefault(str(transacao.get(field, '')), len(dimension)))
+
+    resumo: dict = {
+        'Quantidade': len(valores),
+        'Valor': format_cents(sum(valores)),
+        'ValoresInvalidos': invalid
+    }
+    for name, _ in DIMENSIONS:
+        counts = array('q', [0]) * len(labels[name])
+        sums = array('q', [0]) * len(labels[name])
+        for code, cents in zip(codes[name], valores):
+            counts[code] += 1
+            sums[code] += cents
+        resumo[name] = {
+            label: {'Quantidade': counts[code], 'Valor': format_cents(sums[code])}
+            for label, code in labels[name].items()
+        }
+    return resumo
@@ -0,0 +1,71 @@
+import base64
+import binascii
+import json
+import re
+
+NON_DIGITS = re.compile(r'\D')
+
+
+class InvalidWatermark(ValueError):
+    pass
+
+
+def _date_digits(data: str) -> str:
+    # VanTrnDta pode vir como dd/mm/aaaa ou aaaa-mm-dd; normaliza para aaaammdd
+    data = data or ''
+    if '/' in data:
+        return ''.join(reversed(data.split('/')))
+    return NON_DIGITS.sub('', data)
+
+
+def watermark_key(transacao: dict) -> tuple:
+    # Ordena pelo instante da transacao e desempata pelo VanTrnSeq
+    timestamp: str = _date_digits(transacao.get('VanTrnDta')) + NON_DIGITS.sub('', transacao.get('VanTrnHraFor') or '')
+    seq: str = str(transacao.get('VanTrnSeq') or '')
+    return timestamp, seq.zfill(20)
+
+
+def encode_watermark(key: tuple) -> str:
+    raw: bytes = f'{key[0]}:{key[1].lstrip("0") or "0"}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_watermark(watermark: str) -> tuple:
+    try:
+        raw: str = base64.urlsafe_b64decode(watermark + '=' * (-len(watermark) % 4)).decode()
+    except (binascii.Error, ValueError):
+        raise InvalidWatermark('Watermark inválido')
+    timestamp, separator, seq = raw.partition(':')
+    if not separator:
+        raise InvalidWatermark('Watermark inválido')
+    return timestamp, seq.zfill(20)
+
+
+def newest_key(transacoes, since: tuple = None) -> tuple:
+    # Novo watermark; nunca e anterior ao recebido
+    newest: tuple = since
+    for transacao in transacoes:
+        key: tuple = watermark_key(transacao)
+        if newest is None or key > newest:
+            newest = key
+    return newest
+
+
+def after(transacoes, since: tuple = None):
+    # Transacoes posteriores ao watermark, uma por vez
+    for transacao in transacoes:
+        if since is None or watermark_key(transacao) > since:
+            yield transacao
+
+
+def with_watermark(content: bytes, newest: tuple) -> str:
+    # Acrescenta o watermark ao objeto JSON do retaguarda sem refazer o parse. O
+    # texto sai decodificado direto dos bytes guardados, ate antes do '}' final
+    watermark: str = encode_watermark(newest) if newest else None
+    end: int = content.rfind(b'}') - 1
+    while end >= 0 and content[end] in b' \t\r\n':
+        end -= 1
+    separator: str = '' if content[end:end + 1] == b'{' else ', '
+    body: str = str(memoryview(content)[:end + 1], 'utf-8')
+    body += f'{separator}"watermark": {json.dumps(watermark)}}}'
+    return body
@@ -1,38 +1,228 @@
 import json
 import os
-import requests
-import jwt
+import time
+from datetime import datetime
 import logging
+from bf_shared.deadline import Deadline, DeadlineExceeded, gateway_timeout
+from bf_shared import etag
+from bf_shared.request_context import claim, request_body
+from bf_shared.response import compressed
+from bf_shared import upstream
+from bf_shared.upstream import UpstreamResponse
+import exchange_rates
+import quote_cache
+import quote_history
+import quote_snapshot
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-def lambda_handler(event, context):
-    logger.info('Inicio do evento de cotacoes')
+# Pool de conexoes criado na inicializacao e reaproveitado entre invocacoes quentes
+enfoque = upstream.client('enfoque')
+ENFOQUE_URL = "https://webservice.enfoque.com.br/wsBemFacil/BemFacil.asmx"
+MAX_CONVERSIONS: int = int(os.environ.get('EXCHANGE_MAX_CONVERSIONS', '10000'))
+HISTORY_DEFAULT_INTERVAL: int = 3600
+HISTORY_MAX_DAYS: int = int(os.environ.get('QUOTES_HISTORY_MAX_DAYS', '366'))
+# Limites da serie: um ano em candles de 1 hora cabe, 1 minuto so em poucos dias
+HISTORY_MIN_INTERVAL: int = int(os.environ.get('QUOTES_HISTORY_MIN_INTERVAL', '60'))
+HISTORY_MAX_CANDLES: int = int(os.environ.get('QUOTES_HISTORY_MAX_CANDLES', '10000'))
+
+
+# Snapshot compartilhado gravado pelo refresh_handler (opcional)
+snapshots = quote_snapshot.from_environment()
+# Serie historica das taxas, alimentada pelo refresh_handler (opcional)
+history = quote_history.from_environment()
+
+
+def fetch_enfoque(deadline: Deadline) -> UpstreamResponse:
+    response = deadline.call(lambda timeout: enfoque.post(
+        f"{ENFOQUE_URL}/getCotacoes",
+        headers={'Content-Type': 'application/x-www-form-urlencoded'},
+        data="login=BemFacil&senha=!%40%23BF2023",
+        timeout=timeout
+    ))
+    logger.info('Get cotacoes completed')
+    return UpstreamResponse.from_response(response)
+
+
+def read_snapshot():
+    try:
+        return snapshots.read()
+    except Exception as e:
+        logger.error(f'erro ao ler snapshot de cotacoes: {str(e)}')
+        return None
+
+
+def snapshot_quotes():
+    # Cotacoes do snapshot e a idade real delas, se ainda dentro de STALE_TTL
+    snapshot = read_snapshot()
+    if snapshot is None:
+        return None
+    age: float = max(snapshot.age(), 0)
+    if age >= quote_cache.STALE_TTL:
+        return None
+    return UpstreamResponse(content=snapshot.body.encode()), age
+
+
+def fetch_quotes(deadline: Deadline) -> tuple:
+    # Com snapshot configurado o enfoque so e chamado se o refresher parou de gravar.
+    # A idade volta junto para o cache nao tratar um snapshot antigo como recente.
+    if snapshots is not None:
+        cached = snapshot_quotes()
+        if cached is not None:
+            return cached
+    return fetch_enfoque(deadline), 0
+
+
+quotes_cache = quote_cache.QuoteCache(fetch_quotes)
+if snapshots is not None:
+    # Container novo ja nasce com as cotacoes do snapshot, com a idade real dele;
+    # sem snapshot a primeira requisicao busca no enfoque dentro do proprio prazo
+    initial_quotes = snapshot_quotes()
+    if initial_quotes is not None:
+        quotes_cache.store(initial_quotes[0], fetched_at=time.monotonic() - initial_quotes[1])
+
+
+def refresh_handler(event, context):
+    # Disparado pelo agendamento: unico escritor do snapshot de cotacoes
+    logger.info('Inicio da atualizacao do snapshot de cotacoes')
+    if snapshots is None:
+        logger.error('Nenhum armazenamento de snapshot configurado')
+        return {'statusCode': 500}
+    quotes = fetch_enfoque(Deadline(context))
+    if quotes.status_code != 200:
+        logger.error(f'getCotacoes respondeu {quotes.status_code}, snapshot mantido')
+        return {'statusCode': quotes.status_code}
+    snapshot = quote_snapshot.Snapshot.create(quotes.text)
+    snapshots.write(snapshot)
+    logger.info(f'Snapshot de cotacoes gravado, versao {snapshot.version}')
+    if history is not None:
+        try:
+            rates: dict = exchange_rates.parse_rates(quotes.json())
+            history.record(rates, snapshot.fetched_at, exchange_rates.BASE_CURRENCY)
+            logger.info(f'{len(rates) - 1} taxas registradas no historico')
+        except Exception as e:
+            logger.error(f'erro ao registrar historico de cotacoes: {str(e)}')
+    return {'statusCode': 200, 'version': snapshot.version}
+
+
+def parse_history_date(value: str, end_of_day: bool = False) -> int:
+    day = datetime.strptime(value or '', '%Y%m%d').replace(tzinfo=quote_history.BRT)
+    return int(day.timestamp()) + (86399 if end_of_day else 0)
+
+
+def history_query(event, deadline: Deadline) -> dict:
+    # Serie OHLC de uma moeda entre DataInicio e DataFinal (YYYYMMDD, horario de Brasilia)
+    if history is None:
+        return {
+            'statusCode': 404,
+            'body': json.dumps({'message': 'Histórico de cotações não configurado'})
+        }
+    params: dict = event.get('queryStringParameters') or {}
+    currency: str = str(params.get('Moeda') or '').strip().upper()
+    try:
+        start: int = parse_history_date(params.get('DataInicio'))
+        end: int = parse_history_date(params.get('DataFinal'), end_of_day=True)
+        interval: int = int(params.get('Intervalo') or HISTORY_DEFAULT_INTERVAL)
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': 'DataInicio e DataFinal devem estar no formato YYYYMMDD e Intervalo em segundos'})
+        }
+    if not currency or end < start or end - start >= HISTORY_MAX_DAYS * 86400:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': f'Informe Moeda e um período válido de até {HISTORY_MAX_DAYS} dias'})
+        }
+    if interval < HISTORY_MIN_INTERVAL or (end - start) // interval + 1 > HISTORY_MAX_CANDLES:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({
+                'message': f'Intervalo deve ter ao menos {HISTORY_MIN_INTERVAL} segundos e gerar até {HISTORY_MAX_CANDLES} candles'
+            })
+        }
+
+    series: list = history.ohlc(currency, start, end, interval, deadline)
+    logger.info(f'{len(series)} candles de {currency} consultados')
+    return {
+        'statusCode': 200,
+        'body': json.dumps({'Moeda': currency, 'Intervalo': interval, 'Serie': series})
+    }
+
 
+def convert(event, quotes: UpstreamResponse) -> dict:
+    # Conversoes em lote calculadas localmente a partir das cotacoes em cache
     try:
-        token = event['headers']['Authorization'].replace(' Bearer ', '')
-        token = token.replace('Bearer ', '')
-
-        logger.info('Inicio da decodificacao do token')
-        # Valide o token JWT e extraia os dados necessários
-        decoded_token = jwt.decode(token, options={"verify_signature": False}, algorithms=["HS256"])
-        est_cpf_cnpj = decoded_token.get('custom:EstCpfCnpj')
-
-        logger.info(f'fim da decodificacao do token, cliente identificado: {est_cpf_cnpj}')
-
-        url = "https://webservice.enfoque.com.br/wsBemFacil/BemFacil.asmx"
-        response = requests.post(
-            f"{url}/getCotacoes",
-            headers={'Content-Type': 'application/x-www-form-urlencoded'},
-            data="login=BemFacil&senha=!%40%23BF2023"
-        )
-        logger.info('Get cotacoes completed')
+        body = json.loads(request_body(event) or '{}')
+    except ValueError:
+        body = None
+    conversions = body.get('Conversoes') if isinstance(body, dict) else None
+    if not isinstance(conversions, list) or not conversions or len(conversions) > MAX_CONVERSIONS:
         return {
-            'statusCode': response.status_code,
-            'body': json.dumps(response.json())
+            'statusCode': 400,
+            'body': json.dumps({'message': f'Informe de 1 a {MAX_CONVERSIONS} itens em Conversoes'})
         }
+
+    cross_rates = exchange_rates.cross_rates_for(quotes)
+    results: list = []
+    for conversion in conversions:
+        if not isinstance(conversion, dict):
+            results.append({'Erro': 'Conversão inválida'})
+            continue
+        result: dict = {
+            'Valor': conversion.get('Valor'),
+            'De': conversion.get('De'),
+            'Para': conversion.get('Para')
+        }
+        try:
+            rate, converted = cross_rates.convert(conversion.get('Valor'), conversion.get('De'), conversion.get('Para'))
+            result['Taxa'] = str(rate)
+            result['Resultado'] = str(converted)
+        except exchange_rates.ConversionError as e:
+            result['Erro'] = str(e)
+        results.append(result)
+
+    logger.info(f'{len(results)} conversoes calculadas')
+    return {
+        'statusCode': 200,
+        'body': json.dumps({'Conversoes': results})
+    }
+
+@compressed
+def lambda_handler(event, context):
+    logger.info('Inicio do evento de cotacoes')
+
+    try:
+        # Claims ja validadas pelo autorizador do API Gateway
+        est_cpf_cnpj = claim(event, 'EstCpfCnpj')
+
+        logger.info(f'cliente identificado: {est_cpf_cnpj}')
+
+        if event.get('resource') == '/exchange/history':
+            return history_query(event, Deadline(context))
+
+        quotes = quotes_cache.get(Deadline(context))
+        if event.get('resource') == '/exchange/convert' and quotes.status_code == 200:
+            return convert(event, quotes)
+        if quotes.status_code != 200:
+            return {
+                'statusCode': quotes.status_code,
+                'body': quotes.text
+            }
+        # A lista e POST mas nao tem efeito colateral: a etag da versao em cache
+        # permite responder 304 sem montar o corpo
+        matched_etag: str = etag.matches(event, quotes.etag)
+        if matched_etag:
+            logger.info('Cotacoes nao modificadas, respondendo 304')
+            return etag.not_modified(matched_etag)
+        return etag.with_etag({
+            'statusCode': 200,
+            'body': quotes.text
+        }, quotes.etag)
         
 
+    except DeadlineExceeded as e:
+        logger.error(f'Tempo limite do upstream excedido: {str(e)}')
+        return gateway_timeout()
     except Exception as e:
         logger.error(f'erro encontrato no handler: {str(e)}')
         return {
@@ -0,0 +1,106 @@
+import threading
+from decimal import Decimal, DecimalException, InvalidOperation, ROUND_HALF_UP, localcontext
+
+BASE_CURRENCY = 'BRL'
+
+# O getCotacoes nao tem contrato publicado; estes sao os nomes aceitos para o
+# codigo da moeda e para a taxa (em reais por unidade), em ordem de preferencia
+CODE_KEYS = ('Moeda', 'moeda', 'Codigo', 'codigo', 'Sigla', 'sigla', 'Currency', 'currency')
+RATE_KEYS = ('Venda', 'venda', 'Cotacao', 'cotacao', 'Valor', 'valor', 'Compra', 'compra')
+
+RATE_PRECISION = 28
+CENTS = Decimal('0.01')
+
+
+class ConversionError(ValueError):
+    pass
+
+
+def parse_decimal(value) -> Decimal:
+    # Aceita numeros e textos com virgula decimal (5,4321 ou 1.234,56)
+    if isinstance(value, float):
+        value = repr(value)
+    text: str = str(value).strip()
+    if ',' in text:
+        text = text.replace('.', '').replace(',', '.')
+    try:
+        number = Decimal(text)
+    except InvalidOperation:
+        raise ConversionError(f'Valor inválido: {value}')
+    if not number.is_finite():
+        raise ConversionError(f'Valor inválido: {value}')
+    return number
+
+
+def _quote_items(node):
+    if isinstance(node, list):
+        for item in node:
+            yield from _quote_items(item)
+    elif isinstance(node, dict):
+        if any(key in node for key in CODE_KEYS):
+            yield node
+        else:
+            for value in node.values():
+                yield from _quote_items(value)
+
+
+def parse_rates(quotes) -> dict:
+    rates: dict = {BASE_CURRENCY: Decimal(1)}
+    for item in _quote_items(quotes):
+        code = next((item[key] for key in CODE_KEYS if item.get(key)), None)
+        rate = next((item[key] for key in RATE_KEYS if item.get(key) not in (None, '')), None)
+        if code is None or rate is None:
+            continue
+        try:
+            value = parse_decimal(rate)
+        except ConversionError:
+            continue
+        if value > 0:
+            rates[str(code).strip().upper()] = value
+    return rates
+
+
+class CrossRates:
+    # Matriz de taxas cruzadas calculada uma vez por versao das cotacoes
+
+    def __init__(self, rates: dict):
+        self.currencies = sorted(rates)
+        with localcontext() as context:
+            context.prec = RATE_PRECISION
+            self.matrix: dict = {
+                (source, target): rates[source] / rates[target]
+                for source in self.currencies
+                for target in self.currencies
+            }
+
+    def convert(self, amount, source: str, target: str) -> tuple:
+        source, target = str(source or '').strip().upper(), str(target or '').strip().upper()
+        rate = self.matrix.get((source, target))
+        if rate is None:
+            unknown = source if (source, source) not in self.matrix else target
+            raise ConversionError(f'Moeda não cotada: {unknown}')
+        value: Decimal = parse_decimal(amount)
+        with localcontext() as context:
+            context.prec = RATE_PRECISION
+            try:
+                result = (value * rate).quantize(CENTS, rounding=ROUND_HALF_UP)
+            except DecimalException:
+                # Resultado com mais digitos do que a precisao comporta em centavos,
+                # ou expoente fora do contexto
+                raise ConversionError(f'Valor fora do limite: {amount}')
+        return rate, result
+
+
+_current = (None, None)
+_current_lock = threading.Lock()
+
+
+def cross_rates_for(quotes) -> CrossRates:
+    # quotes e o UpstreamResponse atual do cache; a matriz so e refeita quando ele muda
+    global _current
+    with _current_lock:
+        cached_quotes, cross_rates = _current
+        if cached_quotes is not quotes:
+            cross_rates = CrossRates(parse_rates(quotes.json()))
+            _current = (quotes, cross_rates)
+        return cross_rates
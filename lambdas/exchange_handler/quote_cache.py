@@ -0,0 +1,85 @@
+import logging
+import os
+import threading
+import time
+
+from bf_shared.deadline import Deadline
+
+logger = logging.getLogger()
+
+# Ate FRESH_TTL a cotacao e servida direto; ate STALE_TTL e servida enquanto
+# uma thread atualiza em segundo plano; depois disso a atualizacao e sincrona
+FRESH_TTL: float = float(os.environ.get('QUOTES_FRESH_TTL', '60'))
+STALE_TTL: float = float(os.environ.get('QUOTES_STALE_TTL', '900'))
+
+
+class QuoteCache:
+    # Cache stale-while-revalidate de uma unica resposta do getCotacoes.
+    # fetch recebe um Deadline e devolve (UpstreamResponse, idade em segundos):
+    # uma cotacao lida de um snapshot ja chega com a idade dele.
+
+    def __init__(self, fetch, fresh_ttl: float = FRESH_TTL, stale_ttl: float = STALE_TTL):
+        self.fetch = fetch
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.quotes = None
+        self.fetched_at: float = 0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+    def store(self, quotes, fetched_at: float = None):
+        # Respostas de erro do enfoque nunca substituem a cotacao guardada
+        if quotes.status_code != 200:
+            return
+        with self._lock:
+            self.quotes = quotes
+            self.fetched_at = time.monotonic() if fetched_at is None else fetched_at
+
+    def _refresh(self, deadline: Deadline):
+        quotes, age = self.fetch(deadline)
+        self.store(quotes, fetched_at=time.monotonic() - age)
+        return quotes
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                # Sem contexto do Lambda: a thread pode seguir para a proxima invocacao
+                # se o container congelar, entao usa o prazo padrao da funcao
+                quotes = self._refresh(Deadline(None))
+                logger.info(f'Cotacoes atualizadas em segundo plano: {quotes.status_code}')
+            except Exception as e:
+                logger.error(f'erro ao atualizar cotacoes em segundo plano: {str(e)}')
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def get(self, deadline: Deadline):
+        quotes = self.quotes
+        age: float = self.age()
+        if quotes is not None and age < self.fresh_ttl:
+            return quotes
+        if quotes is not None and age < self.stale_ttl:
+            self._refresh_in_background()
+            return quotes
+
+        try:
+            fresh = self._refresh(deadline)
+        except Exception as e:
+            if quotes is None:
+                raise
+            logger.error(f'erro ao consultar cotacoes, servindo valor antigo ({int(age)}s): {str(e)}')
+            return quotes
+        if fresh.status_code != 200 and quotes is not None:
+            logger.error(f'getCotacoes respondeu {fresh.status_code}, servindo valor antigo ({int(age)}s)')
+            return quotes
+        return fresh
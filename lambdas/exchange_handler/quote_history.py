@@ -0,0 +1,169 @@
+import mmap
+import os
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from bf_shared.deadline import Deadline, DeadlineExceeded
+
+BRT = timezone(timedelta(hours=-3))
+
+# Objetos diarios do S3 baixados em paralelo numa consulta
+READ_WORKERS: int = int(os.environ.get('QUOTES_HISTORY_READ_WORKERS', '16'))
+
+# Taxas guardadas como inteiros escalados: 8 casas decimais exatas por ponto
+SCALE = 10 ** 8
+# Cada ponto e um par (timestamp em segundos, taxa escalada) de int64
+RECORD_SIZE = 2 * array('q').itemsize
+
+
+def to_scaled(rate: Decimal) -> int:
+    return int((rate * SCALE).to_integral_value())
+
+
+def from_scaled(value: int) -> str:
+    return str(Decimal(value) / SCALE)
+
+
+def _split(records: array) -> tuple:
+    return records[0::2], records[1::2]
+
+
+class FileHistoryBackend:
+    # Um arquivo append-only por moeda; a leitura mapeia o arquivo em memoria e
+    # localiza o intervalo por busca binaria nos timestamps
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, currency: str) -> str:
+        return os.path.join(self.directory, f'{currency}.bin')
+
+    def append(self, currency: str, points: list):
+        records = array('q', [value for point in points for value in point])
+        with self._lock, open(self._path(currency), 'ab') as file:
+            records.tofile(file)
+
+    def read(self, currency: str, start: int, end: int, deadline: Deadline = None) -> tuple:
+        path: str = self._path(currency)
+        if not os.path.exists(path) or os.path.getsize(path) < RECORD_SIZE:
+            return array('q'), array('q')
+        with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            usable: int = len(mapped) - len(mapped) % RECORD_SIZE
+            # Todas as views precisam ser liberadas antes de fechar o mmap
+            with memoryview(mapped) as raw, raw[:usable] as data, data.cast('q') as view, view[0::2] as timestamps:
+                first: int = bisect_left(timestamps, start)
+                last: int = bisect_right(timestamps, end)
+                records = array('q', view[2 * first:2 * last])
+        return _split(records)
+
+
+class S3HistoryBackend:
+    # Backend duravel: um objeto por moeda e por dia, regravado pelo unico escritor
+
+    def __init__(self, bucket: str, prefix: str, workers: int = READ_WORKERS):
+        import boto3
+        from botocore.config import Config
+        self.bucket = bucket
+        self.prefix = prefix.rstrip('/')
+        # Uma conexao por worker, senao os GETs paralelos esperam pelo pool
+        self.client = boto3.client('s3', config=Config(max_pool_connections=workers))
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='history')
+
+    def _key(self, currency: str, day: str) -> str:
+        return f'{self.prefix}/{currency}/{day}.bin'
+
+    def _get(self, key: str) -> array:
+        records = array('q')
+        try:
+            obj = self.client.get_object(Bucket=self.bucket, Key=key)
+        except self.client.exceptions.NoSuchKey:
+            return records
+        records.frombytes(obj['Body'].read())
+        return records
+
+    def append(self, currency: str, points: list):
+        by_day: dict = {}
+        for timestamp, value in points:
+            day: str = datetime.fromtimestamp(timestamp, BRT).strftime('%Y%m%d')
+            by_day.setdefault(day, []).extend((timestamp, value))
+        for day, values in by_day.items():
+            key: str = self._key(currency, day)
+            records = self._get(key)
+            records.extend(values)
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=records.tobytes())
+
+    def read(self, currency: str, start: int, end: int, deadline: Deadline = None) -> tuple:
+        keys: list = []
+        day = datetime.fromtimestamp(start, BRT).date()
+        last_day = datetime.fromtimestamp(end, BRT).date()
+        while day <= last_day:
+            keys.append(self._key(currency, day.strftime('%Y%m%d')))
+            day += timedelta(days=1)
+
+        # Um GET por dia, em paralelo; o prazo da invocacao vale para o conjunto
+        futures: list = [self._executor.submit(self._get, key) for key in keys]
+        _, pending = wait(futures, timeout=max(deadline.remaining(), 0) if deadline is not None else None)
+        if pending:
+            for future in pending:
+                future.cancel()
+            raise DeadlineExceeded(f'{len(pending)} de {len(futures)} dias do historico sem resposta dentro do prazo')
+        records = array('q')
+        for future in futures:
+            records.extend(future.result())
+        timestamps, values = _split(records)
+        first: int = bisect_left(timestamps, start)
+        last: int = bisect_right(timestamps, end)
+        return timestamps[first:last], values[first:last]
+
+
+class QuoteHistory:
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def record(self, rates: dict, timestamp: float, base_currency: str):
+        for currency, rate in rates.items():
+            if currency != base_currency:
+                self.backend.append(currency, [(int(timestamp), to_scaled(rate))])
+
+    def ohlc(self, currency: str, start: int, end: int, interval: int, deadline: Deadline = None) -> list:
+        # Reduz a serie a candles de interval segundos alinhados em start
+        timestamps, values = self.backend.read(currency, start, end, deadline)
+        candles: list = []
+        current: dict = None
+        for timestamp, value in zip(timestamps, values):
+            bucket_start: int = start + (timestamp - start) // interval * interval
+            if current is None or current['start'] != bucket_start:
+                current = {'start': bucket_start, 'open': value, 'high': value, 'low': value, 'close': value, 'count': 0}
+                candles.append(current)
+            current['high'] = max(current['high'], value)
+            current['low'] = min(current['low'], value)
+            current['close'] = value
+            current['count'] += 1
+        return [
+            {
+                'Inicio': datetime.fromtimestamp(candle['start'], BRT).isoformat(),
+                'Abertura': from_scaled(candle['open']),
+                'Maxima': from_scaled(candle['high']),
+                'Minima': from_scaled(candle['low']),
+                'Fechamento': from_scaled(candle['close']),
+                'Quantidade': candle['count']
+            }
+            for candle in candles
+        ]
+
+
+def from_environment():
+    bucket: str = os.environ.get('QUOTES_HISTORY_BUCKET', '')
+    if bucket:
+        return QuoteHistory(S3HistoryBackend(bucket, os.environ.get('QUOTES_HISTORY_PREFIX', 'exchange/history')))
+    path: str = os.environ.get('QUOTES_HISTORY_PATH', '')
+    if path:
+        return QuoteHistory(FileHistoryBackend(path))
+    return None
@@ -0,0 +1,103 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+
+# Quantas versoes antigas o SQLite local mantem
+KEEP_VERSIONS = 10
+
+
+class Snapshot:
+
+    def __init__(self, version: int, fetched_at: float, body: str):
+        self.version = version
+        self.fetched_at = fetched_at
+        self.body = body
+
+    @classmethod
+    def create(cls, body: str):
+        fetched_at: float = time.time()
+        return cls(int(fetched_at * 1000), fetched_at, body)
+
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+
+class SqliteSnapshotStore:
+    # Implementacao local (arquivo), usada em testes e execucao fora da AWS
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS quotes ('
+                'version INTEGER PRIMARY KEY, fetched_at REAL NOT NULL, body TEXT NOT NULL)'
+            )
+
+    @contextmanager
+    def _connect(self):
+        # Conexao curta por operacao; o with interno faz commit ou rollback
+        with closing(sqlite3.connect(self.path)) as connection, connection:
+            yield connection
+
+    def read(self) -> Snapshot:
+        with self._lock, self._connect() as connection:
+            row = connection.execute(
+                'SELECT version, fetched_at, body FROM quotes ORDER BY version DESC LIMIT 1'
+            ).fetchone()
+        return Snapshot(*row) if row else None
+
+    def write(self, snapshot: Snapshot):
+        with self._lock, self._connect() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO quotes (version, fetched_at, body) VALUES (?, ?, ?)',
+                (snapshot.version, snapshot.fetched_at, snapshot.body)
+            )
+            connection.execute(
+                'DELETE FROM quotes WHERE version NOT IN '
+                '(SELECT version FROM quotes ORDER BY version DESC LIMIT ?)',
+                (KEEP_VERSIONS,)
+            )
+
+
+class S3SnapshotStore:
+    # Backend remoto compartilhado por todos os containers
+
+    def __init__(self, bucket: str, key: str):
+        import boto3
+        self.bucket = bucket
+        self.key = key
+        self.client = boto3.client('s3')
+
+    def read(self) -> Snapshot:
+        try:
+            obj = self.client.get_object(Bucket=self.bucket, Key=self.key)
+        except self.client.exceptions.NoSuchKey:
+            return None
+        data: dict = json.loads(obj['Body'].read())
+        return Snapshot(data['version'], data['fetched_at'], data['body'])
+
+    def write(self, snapshot: Snapshot):
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self.key,
+            ContentType='application/json',
+            Body=json.dumps({
+                'version': snapshot.version,
+                'fetched_at': snapshot.fetched_at,
+                'body': snapshot.body
+            })
+        )
+
+
+def from_environment():
+    bucket: str = os.environ.get('QUOTES_SNAPSHOT_BUCKET', '')
+    if bucket:
+        return S3SnapshotStore(bucket, os.environ.get('QUOTES_SNAPSHOT_KEY', 'exchange/quotes.json'))
+    path: str = os.environ.get('QUOTES_SNAPSHOT_PATH', '')
+    if path:
+        return SqliteSnapshotStore(path)
+    return None
@@ -2,6 +2,7 @@ import boto3
 import json
 import logging
 import os
+from bf_shared.request_context import request_body
 
 logger = logging.getLogger(__name__)
 
@@ -9,7 +10,7 @@ def lambda_handler(event, context):
     logger.info('Init')
     client = boto3.client('cognito-idp')
     
-    body = json.loads(event['body'])
+    body = json.loads(request_body(event))
     username = body['username']
     password = body['password']
     client_id = os.environ['COGNITO_CLIENT_ID']
@@ -1,27 +1,247 @@
+import hashlib
 import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
 import jwt
+from jwt import PyJWK, PyJWKClient, PyJWKClientError
 
-def lambda_handler(event, context):
-    token = event['authorizationToken']
-    # Valide o token JWT e extraia os dados necessários
-    decoded_token = jwt.decode(token, options={"verify_signature": False})
-    api_key = decoded_token.get('ApiKey')
-    est_cpf_cnpj = decoded_token.get('EstCpfCnpj')
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
 
-    return {
-        'principalId': 'user',
-        'policyDocument': {
+# Decisoes ja calculadas por token; a validade nunca passa do exp do proprio token
+DECISION_CACHE_TTL: int = int(os.environ.get('AUTHORIZER_CACHE_TTL', '300'))
+DECISION_CACHE_MAX_ENTRIES: int = int(os.environ.get('AUTHORIZER_CACHE_MAX_ENTRIES', '1024'))
+
+# Obrigatorio: sem o user pool nao ha como verificar a assinatura, e o
+# authorizer nao sobe em vez de liberar tokens sem verificar
+USER_POOL_ID: str = os.environ.get('COGNITO_USER_POOL_ID', '')
+REGION: str = os.environ.get('AWS_REGION', 'us-east-1')
+# Com COGNITO_APP_CLIENT_ID, o token precisa ser desse app client: aud nos ID
+# tokens, client_id nos access tokens (que nao tem aud)
+APP_CLIENT_ID: str = os.environ.get('COGNITO_APP_CLIENT_ID', '')
+TOKEN_AUDIENCE_CLAIMS: dict = {'id': 'aud', 'access': 'client_id'}
+ISSUER: str = f'https://cognito-idp.{REGION}.amazonaws.com/{USER_POOL_ID}'
+# Validade do JWKS em memoria; a renovacao em segundo plano comeca antes do fim
+JWKS_LIFESPAN: int = int(os.environ.get('JWKS_LIFESPAN', '3600'))
+JWKS_REFRESH_AHEAD: float = 0.8
+# kid desconhecido forca novo download no maximo uma vez nesse intervalo
+JWKS_MIN_REFETCH_SECONDS: float = float(os.environ.get('JWKS_MIN_REFETCH_SECONDS', '60'))
+
+# Rotas liberadas por perfil de claims: a rota entra na politica quando o token
+# tem todas as claims exigidas. A politica cobre o stage inteiro para que o cache
+# de autorizacao do API Gateway sirva qualquer rota com o mesmo token.
+ROUTE_CLAIMS: dict = {
+    'customer': ('ApiKey', 'EstCpfCnpj'),
+    'exchange': (),
+    'vigilante': ()
+}
+
+_decisions: OrderedDict = OrderedDict()
+_decisions_lock = threading.Lock()
+
+
+def cached_decision(key: tuple) -> dict:
+    with _decisions_lock:
+        entry = _decisions.get(key)
+        if entry is None:
+            return None
+        decision, expires_at = entry
+        if expires_at <= time.time():
+            del _decisions[key]
+            return None
+        _decisions.move_to_end(key)
+        return decision
+
+
+def cache_decision(key: tuple, decision: dict, exp):
+    expires_at: float = time.time() + DECISION_CACHE_TTL
+    if isinstance(exp, (int, float)):
+        expires_at = min(expires_at, exp)
+    if expires_at <= time.time():
+        return
+    with _decisions_lock:
+        _decisions[key] = (decision, expires_at)
+        _decisions.move_to_end(key)
+        while len(_decisions) > DECISION_CACHE_MAX_ENTRIES:
+            _decisions.popitem(last=False)
+
+
+class JWKSUnavailable(Exception):
+    # Sem chaves nao ha como decidir: a invocacao falha (5xx) em vez de recusar o token
+    pass
+
+
+class IndexedJWKClient(PyJWKClient):
+    # PyJWKClient com as chaves ja convertidas em PyJWK num dict por kid. O JWKS e
+    # baixado na inicializacao e renovado em segundo plano antes de expirar, entao
+    # nenhuma requisicao espera pela rede enquanto o kid for conhecido.
+
+    def __init__(self, uri: str, lifespan: int = JWKS_LIFESPAN, min_refetch_seconds: float = JWKS_MIN_REFETCH_SECONDS):
+        super().__init__(uri, cache_jwk_set=True, lifespan=lifespan, timeout=5)
+        self.lifespan = lifespan
+        self.min_refetch_seconds = min_refetch_seconds
+        self.keys: dict = {}
+        self.loaded_at: float = 0
+        self._fetched_at: float = -min_refetch_seconds
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def refresh(self):
+        with self._lock:
+            self._fetched_at = time.monotonic()
+        keys: dict = {key.key_id: key for key in self.get_signing_keys(refresh=True)}
+        with self._lock:
+            self.keys = keys
+            self.loaded_at = time.monotonic()
+        logger.info(f'JWKS carregado com {len(keys)} chaves')
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f'erro ao renovar JWKS em segundo plano: {str(e)}')
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def get_signing_key(self, kid: str) -> PyJWK:
+        key: PyJWK = self.keys.get(kid)
+        if key is not None:
+            if time.monotonic() - self.loaded_at > self.lifespan * JWKS_REFRESH_AHEAD:
+                self._refresh_in_background()
+            return key
+
+        # Sem nenhuma chave carregada (falha na inicializacao) o JWKS e buscado na hora.
+        # Com chaves carregadas, kid desconhecido (rotacao no Cognito ou kid forjado)
+        # baixa o JWKS de novo, mas com limite.
+        if not self.keys or time.monotonic() - self._fetched_at >= self.min_refetch_seconds:
+            try:
+                self.refresh()
+            except PyJWKClientError as e:
+                raise JWKSUnavailable(f'JWKS indisponivel: {str(e)}') from e
+            key = self.keys.get(kid)
+        if key is None:
+            raise PyJWKClientError(f'Unable to find a signing key that matches: "{kid}"')
+        return key
+
+
+if not USER_POOL_ID:
+    raise RuntimeError('COGNITO_USER_POOL_ID nao configurado')
+
+jwks = IndexedJWKClient(f'{ISSUER}/.well-known/jwks.json')
+try:
+    jwks.refresh()
+except Exception as e:
+    logger.error(f'erro ao carregar JWKS na inicializacao: {str(e)}')
+
+
+def decode_token(token: str) -> dict:
+    signing_key: PyJWK = jwks.get_signing_key_from_jwt(token)
+    decoded_token: dict = jwt.decode(
+        token,
+        signing_key.key,
+        algorithms=['RS256'],
+        issuer=ISSUER,
+        options={'verify_aud': False, 'require': ['exp', 'iss', 'token_use']}
+    )
+    # ID e access tokens do Cognito; o app client vem de claims diferentes em cada um
+    audience_claim: str = TOKEN_AUDIENCE_CLAIMS.get(decoded_token['token_use'])
+    if audience_claim is None:
+        raise jwt.InvalidTokenError(f'token_use invalido: {decoded_token["token_use"]}')
+    if APP_CLIENT_ID and decoded_token.get(audience_claim) != APP_CLIENT_ID:
+        raise jwt.InvalidAudienceError(f'{audience_claim} invalido')
+    return decoded_token
+
+
+def claim(decoded_token: dict, name: str):
+    # Tokens do Cognito trazem atributos customizados com o prefixo custom:
+    value = decoded_token.get(name)
+    return value if value is not None else decoded_token.get(f'custom:{name}')
+
+
+def stage_arn(method_arn: str) -> str:
+    # arn:aws:execute-api:regiao:conta:api/stage/METODO/caminho -> arn:...:api/stage
+    api_arn, stage, _ = method_arn.split('/', 2)
+    return f'{api_arn}/{stage}'
+
+
+def allowed_routes(decoded_token: dict) -> tuple:
+    return tuple(sorted(
+        route
+        for route, required in ROUTE_CLAIMS.items()
+        if all(claim(decoded_token, name) for name in required)
+    ))
+
+
+@lru_cache(maxsize=256)
+def build_policy(stage: str, routes: tuple) -> dict:
+    # Uma politica por perfil (stage, rotas liberadas), montada uma vez so
+    if not routes:
+        return {
             'Version': '2012-10-17',
             'Statement': [
                 {
                     'Action': 'execute-api:Invoke',
-                    'Effect': 'Allow',
-                    'Resource': event['methodArn']
+                    'Effect': 'Deny',
+                    'Resource': f'{stage}/*/*'
                 }
             ]
-        },
+        }
+    return {
+        'Version': '2012-10-17',
+        'Statement': [
+            {
+                'Action': 'execute-api:Invoke',
+                'Effect': 'Allow',
+                'Resource': [f'{stage}/*/{route}/*' for route in routes]
+            }
+        ]
+    }
+
+
+def build_decision(decoded_token: dict, method_arn: str) -> dict:
+    api_key = claim(decoded_token, 'ApiKey')
+    est_cpf_cnpj = claim(decoded_token, 'EstCpfCnpj')
+
+    return {
+        'principalId': 'user',
+        'policyDocument': build_policy(stage_arn(method_arn), allowed_routes(decoded_token)),
+        # Repassado aos handlers em requestContext.authorizer; o contexto nao aceita null
         'context': {
-            'ApiKey': api_key,
-            'EstCpfCnpj': est_cpf_cnpj
+            'ApiKey': api_key or '',
+            'EstCpfCnpj': est_cpf_cnpj or ''
         }
     }
+
+
+def lambda_handler(event, context):
+    token = event['authorizationToken']
+    # Invocacoes quentes com o mesmo token nao decodificam nada de novo
+    key: tuple = (hashlib.sha256(token.encode()).digest(), stage_arn(event['methodArn']))
+    decision: dict = cached_decision(key)
+    if decision is not None:
+        return decision
+
+    # Valide o token JWT e extraia os dados necessários
+    try:
+        decoded_token = decode_token(token)
+    except (jwt.InvalidTokenError, PyJWKClientError) as e:
+        logger.error(f'Token recusado: {str(e)}')
+        # Mensagem exata que o API Gateway traduz em 401
+        raise Exception('Unauthorized')
+    decision = build_decision(decoded_token, event['methodArn'])
+    cache_decision(key, decision, decoded_token.get('exp'))
+    return decision
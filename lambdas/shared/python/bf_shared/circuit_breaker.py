@@ -0,0 +1,112 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger()
+
+# Janela deslizante de chamadas recentes; o estado vive no container, entao cada
+# instancia da Lambda decide sozinha quando parar de chamar o upstream
+WINDOW_SECONDS: float = float(os.environ.get('CIRCUIT_WINDOW_SECONDS', '30'))
+MIN_CALLS: int = int(os.environ.get('CIRCUIT_MIN_CALLS', '10'))
+ERROR_RATE: float = float(os.environ.get('CIRCUIT_ERROR_RATE', '0.5'))
+SLOW_CALL_SECONDS: float = float(os.environ.get('CIRCUIT_SLOW_CALL_SECONDS', '5'))
+SLOW_RATE: float = float(os.environ.get('CIRCUIT_SLOW_RATE', '0.5'))
+OPEN_SECONDS: float = float(os.environ.get('CIRCUIT_OPEN_SECONDS', '15'))
+HALF_OPEN_PROBES: int = int(os.environ.get('CIRCUIT_HALF_OPEN_PROBES', '1'))
+# Amostras de latencia de chamadas bem-sucedidas usadas nos percentis
+LATENCY_SAMPLES: int = 200
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+
+    def __init__(self, name: str, window_seconds: float = WINDOW_SECONDS, min_calls: int = MIN_CALLS,
+                 error_rate: float = ERROR_RATE, slow_call_seconds: float = SLOW_CALL_SECONDS,
+                 slow_rate: float = SLOW_RATE, open_seconds: float = OPEN_SECONDS,
+                 half_open_probes: int = HALF_OPEN_PROBES):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state: str = CLOSED
+        self._opened_at: float = 0
+        self._probes: int = 0
+        # (instante, falhou, lenta) de cada chamada dentro da janela
+        self._calls: deque = deque()
+        self._latencies: deque = deque(maxlen=LATENCY_SAMPLES)
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+
+    def _open(self, now: float, reason: str):
+        self.state = OPEN
+        self._opened_at = now
+        self._probes = 0
+        logger.error(f'Circuito {self.name} aberto: {reason}')
+
+    def before_call(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            now: float = time.monotonic()
+            if self.state == OPEN:
+                if now - self._opened_at < self.open_seconds:
+                    raise CircuitOpen(f'Circuito {self.name} aberto')
+                self.state = HALF_OPEN
+                self._probes = 0
+                logger.info(f'Circuito {self.name} meio aberto, testando o upstream')
+            # Meio aberto: so algumas chamadas de teste passam ate o resultado chegar
+            if self._probes >= self.half_open_probes:
+                raise CircuitOpen(f'Circuito {self.name} aguardando chamada de teste')
+            self._probes += 1
+
+    def record(self, failed: bool, latency: float):
+        slow: bool = latency >= self.slow_call_seconds
+        with self._lock:
+            now: float = time.monotonic()
+            if not failed:
+                self._latencies.append(latency)
+            if self.state == HALF_OPEN:
+                if failed or slow:
+                    self._open(now, 'chamada de teste falhou')
+                else:
+                    self.state = CLOSED
+                    self._calls.clear()
+                    logger.info(f'Circuito {self.name} fechado')
+                return
+            if self.state == OPEN:
+                return
+
+            self._calls.append((now, failed, slow))
+            self._trim(now)
+            total: int = len(self._calls)
+            if total < self.min_calls:
+                return
+            failures: int = sum(1 for _, call_failed, _ in self._calls if call_failed)
+            slow_calls: int = sum(1 for _, _, call_slow in self._calls if call_slow)
+            if failures / total >= self.error_rate:
+                self._open(now, f'{failures} de {total} chamadas com erro')
+            elif slow_calls / total >= self.slow_rate:
+                self._open(now, f'{slow_calls} de {total} chamadas lentas')
+
+    def latency_percentile(self, percentile: float, min_samples: int = 1) -> float:
+        with self._lock:
+            samples: list = sorted(self._latencies)
+        if len(samples) < max(min_samples, 1):
+            return None
+        return samples[min(int(len(samples) * percentile), len(samples) - 1)]
@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from urllib3.util import Timeout
+
+logger = logging.getLogger()
+
+# Tempo reservado no fim da invocacao para devolver um 504 limpo
+SAFETY_MARGIN_MS: int = int(os.environ.get('DEADLINE_SAFETY_MARGIN_MS', '1500'))
+CONNECT_TIMEOUT: float = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', '3.05'))
+MAX_ATTEMPTS: int = int(os.environ.get('UPSTREAM_MAX_ATTEMPTS', '2'))
+RETRY_BACKOFF: float = float(os.environ.get('UPSTREAM_RETRY_BACKOFF', '0.2'))
+# Sem contexto do Lambda (execucao local) assume o timeout padrao das funcoes
+DEFAULT_BUDGET_MS: int = 30000
+# Abaixo disso nao vale a pena nem abrir a conexao
+MIN_CALL_SECONDS: float = 0.1
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    # Prazo da invocacao derivado de context.get_remaining_time_in_millis().
+    # Todas as chamadas e retentativas ao upstream dividem o mesmo prazo.
+
+    def __init__(self, context, safety_margin_ms: int = SAFETY_MARGIN_MS):
+        remaining_ms = context.get_remaining_time_in_millis() if context is not None else DEFAULT_BUDGET_MS
+        self.expires_at = time.monotonic() + (remaining_ms - safety_margin_ms) / 1000
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def timeout(self, connect: float = CONNECT_TIMEOUT) -> Timeout:
+        remaining: float = self.remaining()
+        if remaining < MIN_CALL_SECONDS:
+            raise DeadlineExceeded('Prazo da requisicao esgotado antes da chamada ao upstream')
+        return Timeout(connect=min(connect, remaining), read=remaining)
+
+    def call(self, request, attempts: int = MAX_ATTEMPTS):
+        # request recebe o timeout e faz a chamada. Falhas de conexao e timeouts
+        # sao repetidas enquanto houver tentativas e prazo; so use attempts > 1
+        # em chamadas idempotentes.
+        attempt: int = 1
+        while True:
+            try:
+                return request(self.timeout())
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt >= attempts or self.remaining() < RETRY_BACKOFF * attempt + MIN_CALL_SECONDS:
+                    if isinstance(e, requests.exceptions.Timeout):
+                        raise DeadlineExceeded(f'Upstream nao respondeu dentro do prazo: {str(e)}') from e
+                    raise
+                logger.info(f'Falha na chamada ao upstream, tentativa {attempt} de {attempts}: {str(e)}')
+                time.sleep(RETRY_BACKOFF * attempt)
+                attempt += 1
+
+    @contextmanager
+    def guard(self, response):
+        # O read timeout vale para cada leitura do socket, entao um upstream que manda
+        # o corpo aos poucos passaria do prazo. Dentro do guard o prazo vale para a
+        # leitura inteira: ao esgotar, a conexao e derrubada e a leitura falha.
+        expired = threading.Event()
+
+        def expire():
+            expired.set()
+            _abort(response)
+
+        timer = threading.Timer(max(self.remaining(), 0), expire)
+        timer.daemon = True
+        timer.start()
+        try:
+            yield
+        except Exception as e:
+            if expired.is_set():
+                raise DeadlineExceeded('Upstream nao terminou a resposta dentro do prazo') from e
+            raise
+        finally:
+            timer.cancel()
+        # Corpo sem tamanho declarado termina no fechamento da conexao: o que chegou pode estar truncado
+        if expired.is_set():
+            raise DeadlineExceeded('Upstream nao terminou a resposta dentro do prazo')
+
+
+def _socket(response):
+    sock = getattr(getattr(response.raw, 'connection', None), 'sock', None)
+    if sock is None:
+        # Com Connection: close o http.client solta a conexao e o socket fica so no arquivo da resposta
+        fp = getattr(getattr(response.raw, '_fp', None), 'fp', None)
+        sock = getattr(getattr(fp, 'raw', None), '_sock', None)
+    return sock
+
+
+def _abort(response):
+    # Derruba o socket da resposta; a leitura bloqueada em outra thread falha na hora
+    sock = _socket(response)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def gateway_timeout() -> dict:
+    return {
+        'statusCode': 504,
+        'body': json.dumps({'message': 'Tempo limite do upstream excedido'})
+    }
@@ -0,0 +1,50 @@
+import hashlib
+
+from bf_shared.request_context import header
+
+
+def strong_etag(*parts) -> str:
+    # Hash curto do conteudo (ou de etags ja calculadas) e dos parametros que mudam a representacao
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part if isinstance(part, (bytes, bytearray)) else str(part).encode())
+        digest.update(b'\0')
+    return f'"{digest.hexdigest()}"'
+
+
+def for_encoding(etag: str, encoding: str) -> str:
+    # Variante da etag para o corpo comprimido: "abc" -> "abc-gzip"
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def matches(event: dict, etag: str) -> str:
+    # Devolve a etag do If-None-Match que corresponde a representacao atual (a
+    # identidade ou uma das variantes comprimidas), ou None. A comparacao e fraca:
+    # W/"x" tambem casa com "x".
+    if_none_match: str = header(event, 'If-None-Match')
+    if not if_none_match or not etag:
+        return None
+    variants: set = {etag, for_encoding(etag, 'gzip'), for_encoding(etag, 'br')}
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*':
+            return etag
+        if tag.removeprefix('W/') in variants:
+            return tag.removeprefix('W/')
+    return None
+
+
+def not_modified(etag: str) -> dict:
+    return {
+        'statusCode': 304,
+        'headers': {'ETag': etag}
+    }
+
+
+def with_etag(response: dict, etag: str) -> dict:
+    if not etag:
+        return response
+    return {
+        **response,
+        'headers': {**(response.get('headers') or {}), 'ETag': etag}
+    }
@@ -0,0 +1,35 @@
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger()
+
+# A copia da chamada sai depois do percentil de latencia observado do upstream
+HEDGE_PERCENTILE: float = float(os.environ.get('UPSTREAM_HEDGE_PERCENTILE', '0.95'))
+HEDGE_MIN_DELAY: float = float(os.environ.get('UPSTREAM_HEDGE_MIN_DELAY', '0.05'))
+# Sem amostras suficientes o percentil nao diz nada e nao ha hedge
+HEDGE_MIN_SAMPLES: int = int(os.environ.get('UPSTREAM_HEDGE_MIN_SAMPLES', '20'))
+HEDGE_MAX_WORKERS: int = int(os.environ.get('UPSTREAM_HEDGE_MAX_WORKERS', '16'))
+
+_executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS, thread_name_prefix='hedge')
+
+
+def hedged(request, delay: float):
+    # Dispara request; se nao responder em delay segundos dispara uma copia e fica
+    # com a primeira resposta. So para chamadas idempotentes.
+    first = _executor.submit(request)
+    done, _ = wait([first], timeout=delay)
+    if done:
+        return first.result()
+
+    logger.info(f'Upstream sem resposta em {delay:.3f}s, disparando chamada duplicada')
+    pending: set = {first, _executor.submit(request)}
+    error: Exception = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                # A chamada que perdeu termina sozinha e devolve a conexao ao pool
+                return future.result()
+            error = future.exception()
+    raise error
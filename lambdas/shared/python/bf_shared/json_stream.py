@@ -0,0 +1,119 @@
+import codecs
+import json
+
+WHITESPACE = ' \t\n\r'
+
+# Prefixo ja consumido do buffer e descartado quando passa desse tamanho
+COMPACT_SIZE = 64 * 1024
+
+
+def encode_object(fields: dict, array_key: str, array_text: str, array_index: int = None) -> str:
+    # Remonta um objeto JSON com o array ja codificado em array_text, na posicao em
+    # que estava no original (no fim quando nao ha posicao)
+    members: list = [
+        f'{json.dumps(key, ensure_ascii=False)}: {json.dumps(value, ensure_ascii=False)}'
+        for key, value in fields.items()
+    ]
+    members.insert(len(members) if array_index is None else array_index, f'{json.dumps(array_key)}: [{array_text}]')
+    return '{' + ', '.join(members) + '}'
+
+
+class JsonObjectStream:
+    # Le um objeto JSON de nivel superior a partir de chunks de bytes e entrega
+    # os itens do array em array_key um por vez, sem montar o corpo inteiro.
+    # Os demais campos do objeto (ret_cod, ret_dsc...) ficam em self.fields
+    # depois que a iteracao termina. Com raw=True os itens saem como o texto
+    # JSON original, para serem repassados sem reserializar.
+    #
+    #     stream = JsonObjectStream(response.raw.stream(65536), 'Transacoes')
+    #     for transacao in stream:
+    #         ...
+    #     stream.fields['ret_cod']
+
+    def __init__(self, chunks, array_key: str, raw: bool = False):
+        self.array_key = array_key
+        self.raw = raw
+        self.fields: dict = {}
+        self.found_array = False
+        # Quantos campos vinham antes do array, para remontar o objeto na mesma ordem
+        self.array_index: int = None
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._exhausted = False
+
+    def _fill(self) -> bool:
+        if self._exhausted:
+            return False
+        if self._pos > COMPACT_SIZE:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        for chunk in self._chunks:
+            text = self._decoder.decode(chunk)
+            if text:
+                self._buffer += text
+                return True
+        self._buffer += self._decoder.decode(b'', final=True)
+        self._exhausted = True
+        return False
+
+    def _peek(self) -> str:
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                raise ValueError('JSON incompleto na resposta do upstream')
+
+    def _expect(self, char: str):
+        if self._peek() != char:
+            raise ValueError(f'JSON invalido na resposta do upstream: esperado {char!r} na posicao {self._pos}')
+        self._pos += 1
+
+    def _value(self, raw: bool = False):
+        self._peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # Numeros e literais no fim do buffer podem continuar no proximo chunk
+            if end == len(self._buffer) and self._fill():
+                continue
+            start, self._pos = self._pos, end
+            return self._buffer[start:end] if raw else value
+
+    def __iter__(self):
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(':')
+            if key == self.array_key and self._peek() == '[':
+                self.found_array = True
+                self.array_index = len(self.fields)
+                self._pos += 1
+                if self._peek() == ']':
+                    self._pos += 1
+                else:
+                    while True:
+                        yield self._value(self.raw)
+                        if self._peek() == ',':
+                            self._pos += 1
+                            continue
+                        self._expect(']')
+                        break
+            else:
+                self.fields[key] = self._value()
+            if self._peek() == ',':
+                self._pos += 1
+                continue
+            self._expect('}')
+            return
@@ -0,0 +1,53 @@
+import base64
+import json
+from functools import lru_cache
+
+
+def header(event: dict, name: str) -> str:
+    # O API Gateway repassa os headers com a caixa enviada pelo cliente
+    name = name.lower()
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def request_body(event: dict) -> str:
+    # Com binary_media_types habilitado no API Gateway o corpo chega em base64
+    body = event.get('body')
+    if body and event.get('isBase64Encoded'):
+        return base64.b64decode(body).decode()
+    return body
+
+
+def bearer_token(event: dict) -> str:
+    authorization: str = (header(event, 'Authorization') or '').strip()
+    return authorization.removeprefix('Bearer ').strip()
+
+
+@lru_cache(maxsize=64)
+def decode_claims(token: str) -> dict:
+    # So le o payload: a assinatura ja foi conferida pelo autorizador do API Gateway
+    payload: str = token.split('.')[1]
+    return json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+
+
+def claims(event: dict) -> dict:
+    # Autorizador Cognito entrega as claims em authorizer.claims; o jwt_validator
+    # entrega ApiKey e EstCpfCnpj direto no contexto. Sem nenhum dos dois, le o token.
+    authorizer: dict = (event.get('requestContext') or {}).get('authorizer') or {}
+    if isinstance(authorizer.get('claims'), dict):
+        return authorizer['claims']
+    if authorizer.get('ApiKey') or authorizer.get('EstCpfCnpj'):
+        return authorizer
+    token: str = bearer_token(event)
+    return decode_claims(token) if token else {}
+
+
+def claim(event: dict, name: str) -> str:
+    # Atributos customizados do Cognito vem com o prefixo custom:
+    values: dict = claims(event)
+    value = values.get(name)
+    if value in (None, ''):
+        value = values.get(f'custom:{name}')
+    return value
@@ -0,0 +1,115 @@
+import base64
+import functools
+import gzip
+import os
+
+from bf_shared import etag
+from bf_shared.request_context import header
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Corpos menores que isso nao compensam o custo de comprimir
+MIN_COMPRESS_SIZE: int = int(os.environ.get('RESPONSE_MIN_COMPRESS_SIZE', '1024'))
+
+# Nivel de compressao cai conforme o corpo cresce para limitar o custo de CPU
+GZIP_LEVELS = ((64 * 1024, 6), (1024 * 1024, 4), (None, 1))
+BROTLI_LEVELS = ((64 * 1024, 5), (1024 * 1024, 4), (None, 1))
+
+
+def _level(levels: tuple, size: int) -> int:
+    for limit, level in levels:
+        if limit is None or size <= limit:
+            return level
+
+
+def _accepted_encodings(accept_encoding: str) -> dict:
+    encodings: dict = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality: float = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        encodings[name] = quality
+    return encodings
+
+
+def _choose_encoding(accept_encoding: str) -> str:
+    encodings: dict = _accepted_encodings(accept_encoding)
+    candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+    wildcard: float = encodings.get('*', 0.0)
+    best, best_quality = None, 0.0
+    for encoding in candidates:
+        quality = encodings.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=_level(BROTLI_LEVELS, len(body)))
+    return gzip.compress(body, compresslevel=_level(GZIP_LEVELS, len(body)), mtime=0)
+
+
+def _with_vary(response: dict) -> dict:
+    # A resposta depende do Accept-Encoding mesmo quando sai sem compressao
+    headers: dict = dict(response.get('headers') or {})
+    vary: str = headers.get('Vary')
+    if not vary:
+        headers['Vary'] = 'Accept-Encoding'
+    elif 'accept-encoding' not in vary.lower():
+        headers['Vary'] = f'{vary}, Accept-Encoding'
+    return {**response, 'headers': headers}
+
+
+def finalize(event: dict, response: dict) -> dict:
+    response = _with_vary(response)
+    body = response.get('body')
+    if not isinstance(body, str) or response.get('isBase64Encoded'):
+        return response
+    raw: bytes = body.encode()
+    if len(raw) < MIN_COMPRESS_SIZE:
+        return response
+
+    encoding: str = _choose_encoding(header(event, 'Accept-Encoding'))
+    if encoding is None:
+        return response
+
+    size: int = len(raw)
+    compressed: bytes = _compress(raw, encoding)
+    # A copia codificada do corpo nao e mais necessaria
+    del raw
+    if len(compressed) >= size:
+        return response
+
+    headers: dict = dict(response['headers'])
+    headers['Content-Encoding'] = encoding
+    headers.setdefault('Content-Type', 'application/json')
+    if headers.get('ETag'):
+        # Etag forte muda junto com a codificacao do conteudo
+        headers['ETag'] = etag.for_encoding(headers['ETag'], encoding)
+    return {
+        **response,
+        'headers': headers,
+        'body': base64.b64encode(compressed).decode(),
+        'isBase64Encoded': True
+    }
+
+
+def compressed(handler):
+    # Decorador do lambda_handler: comprime a resposta conforme o Accept-Encoding
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        return finalize(event, handler(event, context))
+    return wrapper
+
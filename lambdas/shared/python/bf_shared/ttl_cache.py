@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    # Cache LRU em memoria com expiracao por entrada. Vive no escopo do modulo,
+    # entao sobrevive entre invocacoes quentes do mesmo container.
+    # Com max_bytes o cache tambem e limitado pela soma dos tamanhos informados
+    # em set(); entradas maiores que o limite inteiro nao sao guardadas.
+
+    def __init__(self, max_entries: int = 128, max_bytes: int = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size: int = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at, _ = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def ttl(self, key) -> float:
+        # Segundos restantes de vida da entrada, 0 se ausente ou expirada
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return 0
+            return max(entry[1] - time.monotonic(), 0)
+
+    def set(self, key, value, ttl: float, size: int = 0):
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._entries[key] = (value, time.monotonic() + ttl, size)
+            self.size += size
+            while len(self._entries) > self.max_entries or (self.max_bytes is not None and self.size > self.max_bytes):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,168 @@
+import json
+import os
+import re
+import threading
+import time
+from functools import cached_property
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from bf_shared.circuit_breaker import CircuitBreaker
+from bf_shared.etag import strong_etag
+from bf_shared.hedging import HEDGE_MIN_DELAY, HEDGE_MIN_SAMPLES, HEDGE_PERCENTILE, hedged
+from bf_shared.json_stream import JsonObjectStream
+
+RET_COD = re.compile(rb'"ret_cod"\s*:\s*(-?\d+)')
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+POOL_CONNECTIONS: int = int(os.environ.get('UPSTREAM_POOL_CONNECTIONS', '4'))
+POOL_MAXSIZE: int = int(os.environ.get('UPSTREAM_POOL_MAXSIZE', '10'))
+# Conexoes paradas por mais tempo que isso (container congelado entre invocacoes)
+# provavelmente ja foram derrubadas pelo servidor e sao descartadas antes do uso
+IDLE_RESET_SECONDS: float = float(os.environ.get('UPSTREAM_IDLE_RESET_SECONDS', '55'))
+
+
+def ret_cod_status(ret_cod: int) -> int:
+    # Convencao do retaguarda: 0 sucesso, 6 registro nao encontrado, demais sao erro
+    if not ret_cod:
+        return 200
+    if ret_cod == 6:
+        return 404
+    return 400
+
+
+class UpstreamResponse:
+    # Corpo de uma resposta de upstream. Guarda os bytes originais para serem
+    # repassados sem reserializar e so faz o parse completo quando alguem
+    # precisa do conteudo.
+
+    def __init__(self, content: bytes = None, body=None, status_code: int = 200):
+        self._content = content
+        self._body = body
+        self.status_code = status_code
+
+    @classmethod
+    def from_response(cls, response):
+        return cls(content=response.content, status_code=response.status_code)
+
+    @classmethod
+    def from_stream(cls, response):
+        # Para respostas pedidas com stream=True: le o corpo em chunks direto num
+        # unico buffer, sem lista de chunks nem join, e guarda so os bytes originais,
+        # que seguem para o cache e para o repasse sem parse
+        content = bytearray()
+        for chunk in response.raw.stream(STREAM_CHUNK_SIZE, decode_content=True):
+            content += chunk
+        return cls(content=content, status_code=response.status_code)
+
+    def stream(self, array_key: str, raw: bool = False) -> JsonObjectStream:
+        # Itens de array_key decodificados um por vez a partir dos bytes guardados,
+        # sem montar a arvore do corpo inteiro
+        content = memoryview(self.content)
+        return JsonObjectStream(
+            (content[start:start + STREAM_CHUNK_SIZE] for start in range(0, len(content), STREAM_CHUNK_SIZE)),
+            array_key,
+            raw
+        )
+
+    @property
+    def content(self) -> bytes:
+        if self._content is None:
+            self._content = json.dumps(self._body).encode()
+        return self._content
+
+    @property
+    def text(self) -> str:
+        return self.content.decode()
+
+    def json(self):
+        if self._body is None:
+            self._body = json.loads(self._content)
+        return self._body
+
+    @cached_property
+    def etag(self) -> str:
+        # Calculada uma vez por resposta; respostas em cache reaproveitam o valor
+        return strong_etag(self.content)
+
+    @property
+    def ret_cod(self) -> int:
+        # Le apenas o ret_cod, sem montar a arvore inteira do corpo
+        if self._body is not None:
+            return self._body.get('ret_cod', 0) if isinstance(self._body, dict) else 0
+        match = RET_COD.search(self._content)
+        return int(match.group(1)) if match else 0
+
+
+class UpstreamClient:
+    # requests.Session com pool de conexoes keep-alive, criada uma vez por
+    # upstream e reaproveitada entre invocacoes quentes do container.
+    # Com breaker as chamadas passam pelo circuit breaker do upstream; com hedge
+    # os GETs ganham uma copia se passarem do p95 de latencia medido pelo breaker.
+
+    def __init__(self, name: str, pool_connections: int = POOL_CONNECTIONS, pool_maxsize: int = POOL_MAXSIZE,
+                 breaker: CircuitBreaker = None, hedge: bool = False):
+        self.name = name
+        self.breaker = breaker
+        self.hedge = hedge
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._last_used = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _check_idle(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_used > IDLE_RESET_SECONDS:
+                # Fecha so os pools; o adapter abre conexoes novas sob demanda
+                self.session.close()
+            self._last_used = now
+
+    def _hedge_delay(self, method: str, kwargs: dict) -> float:
+        if not self.hedge or self.breaker is None or method != 'GET' or kwargs.get('stream'):
+            return None
+        delay: float = self.breaker.latency_percentile(HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES)
+        return None if delay is None else max(delay, HEDGE_MIN_DELAY)
+
+    def _send(self, method: str, url: str, **kwargs):
+        delay: float = self._hedge_delay(method, kwargs)
+        if delay is None:
+            return self.session.request(method, url, **kwargs)
+        return hedged(lambda: self.session.request(method, url, **kwargs), delay)
+
+    def request(self, method: str, url: str, **kwargs):
+        self._check_idle()
+        if self.breaker is None:
+            return self.session.request(method, url, **kwargs)
+
+        # Levanta CircuitOpen sem chamar o upstream enquanto o circuito estiver aberto
+        self.breaker.before_call()
+        started: float = time.monotonic()
+        try:
+            response = self._send(method, url, **kwargs)
+        except Exception:
+            self.breaker.record(True, time.monotonic() - started)
+            raise
+        self.breaker.record(response.status_code >= 500, time.monotonic() - started)
+        return response
+
+    def get(self, url: str, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+
+_clients: dict = {}
+_clients_lock = threading.Lock()
+
+
+def client(name: str, **kwargs) -> UpstreamClient:
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = UpstreamClient(name, **kwargs)
+        return _clients[name]
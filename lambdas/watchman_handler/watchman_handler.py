@@ -1,50 +1,147 @@
 import json
 import os
-import requests
-import jwt
 import logging
-from urllib.parse import urlencode  # Para construir a query string
+from concurrent.futures import ThreadPoolExecutor
+from bf_shared.request_context import claim, request_body
+from bf_shared.deadline import Deadline, DeadlineExceeded, gateway_timeout
+from bf_shared.response import compressed
+from bf_shared import upstream
+from bf_shared.circuit_breaker import CircuitBreaker, CircuitOpen
+from bf_shared.ttl_cache import TTLCache
+from bf_shared.upstream import UpstreamResponse
+import watchman_prefilter
+import watchman_query
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Pool de conexoes criado na inicializacao e reaproveitado entre invocacoes quentes
+BATCH_MAX_WORKERS: int = int(os.environ.get('WATCHMAN_BATCH_MAX_WORKERS', '8'))
+BATCH_MAX_QUERIES: int = int(os.environ.get('WATCHMAN_BATCH_MAX_QUERIES', '100'))
+# Hedge opcional: GETs lentos ganham uma copia depois do p95 observado
+HEDGE_ENABLED: bool = os.environ.get('WATCHMAN_HEDGE_ENABLED', 'false').lower() in ('true', '1')
+watchman = upstream.client(
+    'watchman',
+    pool_maxsize=max(BATCH_MAX_WORKERS, upstream.POOL_MAXSIZE),
+    breaker=CircuitBreaker('watchman'),
+    hedge=HEDGE_ENABLED
+)
+WATCHMAN_URL = "http://10.0.0.210:8084"
+
+# Resultados por consulta normalizada; nomes repetidos nao saem da Lambda
+CACHE_TTL: float = float(os.environ.get('WATCHMAN_CACHE_TTL', '300'))
+CACHE_MAX_ENTRIES: int = int(os.environ.get('WATCHMAN_CACHE_MAX_ENTRIES', '1024'))
+search_cache = TTLCache(CACHE_MAX_ENTRIES)
+# Indice local opcional: nomes sem nenhum candidato nem chegam ao watchman
+prefilter = watchman_prefilter.from_environment()
+
+
+def search(normalized: tuple, deadline: Deadline) -> UpstreamResponse:
+    # normalized e a consulta ja na forma canonica (watchman_query.normalize)
+    if prefilter is not None and prefilter.rejects(normalized):
+        logger.info('Consulta descartada pelo pre-filtro local')
+        return UpstreamResponse(content=prefilter.index.empty_response)
+
+    query_params: str = watchman_query.query_string(normalized)
+    result: UpstreamResponse = search_cache.get(query_params)
+    if result is not None:
+        logger.info('Consulta atendida pelo cache')
+        return result
+
+    # Fazer a requisição GET com a query string canonica
+    response = deadline.call(lambda timeout: watchman.get(
+        f"{WATCHMAN_URL}/search?{query_params}",
+        headers={'accept': 'application/json', 'x-request-id': '94c825ee'},
+        timeout=timeout
+    ))
+    logger.info('Get request to watchman completed')
+    result = UpstreamResponse.from_response(response)
+    if result.status_code == 200:
+        search_cache.set(query_params, result, CACHE_TTL)
+    return result
+
+
+def batch_item(result) -> dict:
+    if isinstance(result, DeadlineExceeded):
+        return {'Erro': 'Tempo limite do upstream excedido'}
+    if isinstance(result, CircuitOpen):
+        return {'Erro': 'Watchman temporariamente indisponível'}
+    if isinstance(result, Exception):
+        return {'Erro': str(result)}
+    if result.status_code != 200:
+        return {'Erro': f'Watchman respondeu {result.status_code}'}
+    return {'Resultado': result.json()}
+
+
+def batch_search(body_parameters: dict, deadline: Deadline) -> dict:
+    # Varias consultas em uma chamada: repetidas sao feitas uma vez so, em paralelo
+    # limitado, e os resultados voltam na ordem de entrada
+    queries = body_parameters.get('Consultas') if isinstance(body_parameters, dict) else None
+    valid: bool = isinstance(queries, list) and 0 < len(queries) <= BATCH_MAX_QUERIES
+    if not valid or not all(isinstance(query, dict) for query in queries):
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': f'Informe de 1 a {BATCH_MAX_QUERIES} consultas em Consultas'})
+        }
+
+    keys: list = [watchman_query.normalize(query) for query in queries]
+    unique: list = list(dict.fromkeys(keys))
+    logger.info(f'{len(queries)} consultas em lote, {len(unique)} distintas')
+
+    def run(normalized: tuple):
+        try:
+            return search(normalized, deadline)
+        except Exception as e:
+            logger.error(f'Erro na consulta em lote: {str(e)}')
+            return e
+
+    with ThreadPoolExecutor(max_workers=min(len(unique), BATCH_MAX_WORKERS)) as executor:
+        results: dict = dict(zip(unique, executor.map(run, unique)))
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'Resultados': [
+                {'Consulta': query, **batch_item(results[key])}
+                for query, key in zip(queries, keys)
+            ]
+        })
+    }
+
+
+@compressed
 def lambda_handler(event, context):
     logger.info('Inicio do evento de cotacoes')
 
     try:
-        # Extrair o token do cabeçalho e decodificá-lo
-        token = event['headers']['Authorization'].replace(' Bearer ', '')
-        token = token.replace('Bearer ', '')
-
-        logger.info('Inicio da decodificacao do token')
-        decoded_token = jwt.decode(token, options={"verify_signature": False}, algorithms=["HS256"])
-        est_cpf_cnpj = decoded_token.get('custom:EstCpfCnpj')
+        # Claims ja validadas pelo autorizador do API Gateway
+        est_cpf_cnpj = claim(event, 'EstCpfCnpj')
 
-        logger.info(f'fim da decodificacao do token, cliente identificado: {est_cpf_cnpj}')
+        logger.info(f'cliente identificado: {est_cpf_cnpj}')
 
         # Extrair o corpo da requisição
         if 'body' in event:
-            request_body = json.loads(event['body'])  # Decodificar JSON do corpo
-
-        # Montar a query string com os dados do corpo
-        query_params = urlencode(request_body)  # Converte o dicionário do body para query string
+            body_parameters = json.loads(request_body(event))  # Decodificar JSON do corpo
 
-        # Definir a URL da requisição com a query string
-        url = f"http://10.0.0.210:8084/search?{query_params}"
+        if event.get('resource') == '/vigilante/batch':
+            return batch_search(body_parameters, Deadline(context))
 
-        # Fazer a requisição GET com a URL completa
-        response = requests.get(
-            url,
-            headers={'accept': 'application/json', 'x-request-id': '94c825ee'}
-        )
+        result = search(watchman_query.normalize(body_parameters), Deadline(context))
 
-        logger.info('Get request to watchman completed')
-        
         return {
             'statusCode': 200,
-            'body': json.dumps(response.json())
+            'body': result.text
         }
 
+    except DeadlineExceeded as e:
+        logger.error(f'Tempo limite do upstream excedido: {str(e)}')
+        return gateway_timeout()
+    except CircuitOpen as e:
+        logger.error(f'Chamada ao watchman bloqueada: {str(e)}')
+        return {
+            'statusCode': 503,
+            'body': json.dumps({'message': 'Watchman temporariamente indisponível'})
+        }
     except Exception as e:
         logger.error(f'Erro encontrado no handler: {str(e)}')
         return {
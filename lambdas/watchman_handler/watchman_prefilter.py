@@ -0,0 +1,354 @@
+import argparse
+import csv
+import json
+import logging
+import math
+import os
+import struct
+import threading
+import time
+from array import array
+
+import watchman_query
+
+logger = logging.getLogger()
+
+# Arquivo do indice: MAGIC, tamanho do cabecalho JSON, cabecalho, e depois os
+# tokens distintos dos nomes e suas juncoes em UTF-8, um por linha, ordenados por
+# tamanho. Indices sem as juncoes (BFPX0002) sao recusados.
+MAGIC = b'BFPX0003'
+HEADER = struct.Struct('<8sI')
+
+# Jaro-Winkler do watchman: bonus de ate 4 letras de prefixo comum, peso 0.1 cada
+WINKLER_PREFIX: int = 4
+WINKLER_WEIGHT: float = 0.1
+# Acima desse numero de candidatos verificados a consulta segue para o watchman;
+# deixar de descartar nunca muda o resultado
+MAX_CANDIDATES: int = int(os.environ.get('WATCHMAN_PREFILTER_MAX_CANDIDATES', '2000'))
+
+# Copia local do snapshot publicado no S3; o diretorio do codigo e somente leitura
+SNAPSHOT_PATH: str = '/tmp/watchman_prefilter.idx'
+
+# Resposta do watchman sem nenhum candidato, usada quando o indice nao tem o cabecalho
+EMPTY_RESPONSE: dict = {
+    'SDNs': [],
+    'altNames': [],
+    'addresses': [],
+    'sectoralSanctions': [],
+    'deniedPersons': [],
+    'bisEntities': []
+}
+
+# O watchman tambem compara palavras curtas (particulas como de, la, al) juntadas
+# aos vizinhos: 'de la cruz' vira 'delacruz'. O indice guarda toda concatenacao de
+# tokens vizinhos em que cada emenda tem pelo menos um lado com ate SHORT_TOKEN
+# letras, o que cobre qualquer regra que so junte palavras curtas aos vizinhos.
+# Tokens curtos no meio podem ser pulados, cobrindo stopwords removidas antes.
+SHORT_TOKEN: int = 3
+
+
+def joins(tokens: list) -> set:
+    # Tokens e suas juncoes: ['al', "qa'ida"] -> {'al', "qa'ida", "alqa'ida"}
+    result: set = set(tokens)
+    for start, first in enumerate(tokens):
+        # (texto juntado, tamanho do ultimo token)
+        partial: set = {(first, len(first))}
+        for token in tokens[start + 1:]:
+            short: bool = len(token) <= SHORT_TOKEN
+            joined: set = {(text + token, len(token)) for text, last in partial if short or last <= SHORT_TOKEN}
+            result.update(text for text, _ in joined)
+            partial = joined | partial if short else joined
+            if not partial:
+                break
+    return result
+
+
+def name_tokens(name: str) -> set:
+    # Tokens de um nome da lista na normalizacao do watchman (watchman_query.fold) e
+    # suas juncoes, tambem na ordem com o trecho depois da virgula primeiro
+    # ('CRUZ, Juan de la' -> 'Juan de la CRUZ'), como o watchman reordena os nomes
+    segments: list = str(name).split(',')
+    result: set = set()
+    for start in range(len(segments)):
+        reordered: str = ' '.join(segments[start:] + segments[:start])
+        result |= joins(watchman_query.fold(reordered).split())
+    return result
+
+
+def elements(token: str) -> list:
+    # Letras do token como multiconjunto: 'anna' -> (a, 1), (n, 1), (n, 2), (a, 2)
+    seen: dict = {}
+    result: list = []
+    for char in token:
+        seen[char] = seen.get(char, 0) + 1
+        result.append((char, seen[char]))
+    return result
+
+
+def window_matches(a: str, b: str, window: int) -> int:
+    # Maior numero de pares de letras iguais a no maximo window posicoes de distancia.
+    # Limita por cima o m do Jaro de qualquer implementacao com janela <= window.
+    positions: dict = {}
+    for position, char in enumerate(b):
+        positions.setdefault(char, []).append(position)
+    own: dict = {}
+    for position, char in enumerate(a):
+        own.setdefault(char, []).append(position)
+    matches: int = 0
+    for char, left in own.items():
+        right: list = positions.get(char)
+        if not right:
+            continue
+        i = j = 0
+        while i < len(left) and j < len(right):
+            if right[j] < left[i] - window:
+                j += 1
+            elif right[j] > left[i] + window:
+                i += 1
+            else:
+                matches += 1
+                i += 1
+                j += 1
+    return matches
+
+
+def jaro_winkler_bound(a: str, b: str) -> float:
+    # Jaro-Winkler maximo entre a e b: m pela maior janela, nenhuma transposicao e o
+    # prefixo comum real
+    matches: int = window_matches(a, b, max(len(a), len(b)) // 2)
+    if not matches:
+        return 0.0
+    jaro: float = (matches / len(a) + matches / len(b) + 1) / 3
+    prefix: int = 0
+    for left, right in zip(a[:WINKLER_PREFIX], b[:WINKLER_PREFIX]):
+        if left != right:
+            break
+        prefix += 1
+    return jaro + prefix * WINKLER_WEIGHT * (1 - jaro)
+
+
+class PrefilterIndex:
+    # Tokens distintos dos nomes das listas do watchman, agrupados por tamanho, com
+    # listas invertidas por (tamanho, letra, ocorrencia) para achar os candidatos
+
+    def __init__(self, path: str):
+        self.path = path
+        self.mtime: float = os.path.getmtime(path)
+        with open(path, 'rb') as file:
+            magic, header_size = HEADER.unpack(file.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f'Arquivo de indice invalido: {path}')
+            self.header: dict = json.loads(file.read(header_size))
+            text: str = file.read().decode()
+        self.empty_response: bytes = json.dumps(self.header.get('empty_response', EMPTY_RESPONSE)).encode()
+        self.tokens: frozenset = frozenset(text.split('\n')) - {''}
+
+        self.by_length: dict = {}
+        postings: dict = {}
+        self.frequency: dict = {}
+        for token in sorted(self.tokens):
+            group: list = self.by_length.setdefault(len(token), [])
+            for element in elements(token):
+                postings.setdefault((len(token),) + element, []).append(len(group))
+                self.frequency[element] = self.frequency.get(element, 0) + 1
+            group.append(token)
+        self.postings: dict = {key: array('I', positions) for key, positions in postings.items()}
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def similar_token(self, token: str, min_match: float) -> bool:
+        # Falso so quando nenhum token do indice pode chegar a min_match de
+        # Jaro-Winkler com token. Como Jaro <= (m/|a| + m/|b| + 1) / 3 e o bonus de
+        # prefixo e no maximo 0.4 * (1 - Jaro), um candidato de tamanho L precisa de
+        # pelo menos need letras em comum; entao ele contem uma das
+        # len(token) - need + 1 letras mais raras do token.
+        if token in self.tokens or not token.isascii():
+            # O watchman mede tamanhos em bytes; fora do ASCII o limite nao vale
+            return True
+        boost: float = WINKLER_PREFIX * WINKLER_WEIGHT
+        ratio: float = 3 * (min_match - boost) / (1 - boost) - 1
+        if ratio <= 0:
+            return True
+        size: int = len(token)
+        rarest: list = sorted(elements(token), key=lambda element: self.frequency.get(element, 0))
+        checked: int = 0
+        for length, group in self.by_length.items():
+            need: int = math.ceil(ratio * size * length / (size + length) - 1e-9)
+            if need > min(size, length):
+                continue
+            candidates: set = set()
+            for element in rarest[:size - need + 1]:
+                candidates.update(self.postings.get((length,) + element, ()))
+            checked += len(candidates)
+            if checked > MAX_CANDIDATES:
+                return True
+            for position in candidates:
+                if jaro_winkler_bound(token, group[position]) >= min_match - 1e-9:
+                    return True
+        return False
+
+    def possible_match(self, name: str, min_match: float) -> bool:
+        # O score de nome do watchman e a media, ponderada pelo tamanho, do
+        # Jaro-Winkler dos melhores pares de tokens (ou de juncoes de tokens
+        # vizinhos), multiplicada por penalidades <= 1; nunca passa do melhor par.
+        # Se nenhum token ou juncao da consulta tem vizinho no indice, que ja guarda
+        # as juncoes dos nomes da lista, nenhum nome chega a min_match.
+        tokens: list = name.split()
+        if not tokens:
+            return True
+        return any(self.similar_token(token, min_match) for token in sorted(joins(tokens), key=len))
+
+
+class S3Snapshot:
+    # Snapshot publicado no S3 pelo job que atualiza as listas do watchman
+    # (python watchman_prefilter.py --bucket). A copia em /tmp e baixada de novo
+    # quando o ETag do objeto muda.
+
+    def __init__(self, bucket: str, key: str, path: str = SNAPSHOT_PATH):
+        import boto3
+        self.bucket = bucket
+        self.key = key
+        self.path = path
+        self.etag: str = None
+        self.client = boto3.client('s3')
+
+    def sync(self):
+        etag: str = self.client.head_object(Bucket=self.bucket, Key=self.key)['ETag']
+        if etag == self.etag and os.path.exists(self.path):
+            return
+        temporary: str = f'{self.path}.tmp'
+        self.client.download_file(self.bucket, self.key, temporary)
+        os.replace(temporary, self.path)
+        self.etag = etag
+        logger.info(f'Snapshot do pre-filtro baixado de s3://{self.bucket}/{self.key}')
+
+
+class Prefilter:
+    # Recarrega o indice quando o arquivo muda, verificando no maximo a cada
+    # check_seconds. Com snapshot no S3 a verificacao baixa o arquivo novo; ela
+    # roda em segundo plano, entao nenhuma consulta espera pelo download.
+
+    def __init__(self, path: str, min_match: float, check_seconds: float, snapshot: S3Snapshot = None):
+        self.path = path
+        self.min_match = min_match
+        self.check_seconds = check_seconds
+        self.snapshot = snapshot
+        self.index: PrefilterIndex = None
+        self._checked_at: float = 0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._reload()
+
+    def _reload(self):
+        try:
+            if self.snapshot is not None:
+                self.snapshot.sync()
+            mtime: float = os.path.getmtime(self.path)
+            if self.index is None or mtime != self.index.mtime:
+                self.index = PrefilterIndex(self.path)
+                logger.info(f'Indice de pre-filtro carregado: {len(self.index)} tokens')
+        except Exception as e:
+            logger.error(f'erro ao carregar indice de pre-filtro: {str(e)}')
+        self._checked_at = time.monotonic()
+
+    def _reload_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self._reload()
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def current(self) -> PrefilterIndex:
+        if time.monotonic() - self._checked_at > self.check_seconds:
+            self._reload_in_background()
+        return self.index
+
+    def rejects(self, normalized: tuple) -> bool:
+        # So descarta buscas por name com minMatch alto o bastante; sem minMatch o
+        # watchman sempre devolve os melhores candidatos, por piores que sejam.
+        # q tambem compara enderecos e outros campos e nunca e descartada.
+        params: dict = dict(normalized)
+        if set(params) - {'name', 'limit', 'minMatch'}:
+            return False
+        name: str = params.get('name')
+        try:
+            min_match: float = float(params.get('minMatch', 0))
+        except ValueError:
+            return False
+        index: PrefilterIndex = self.current()
+        if index is None or not name or not min_match >= self.min_match:
+            return False
+        return not index.possible_match(name, min_match)
+
+
+def from_environment():
+    # Snapshot no S3 (copiado para /tmp) ou arquivo local, por exemplo de uma layer em /opt
+    min_match: float = float(os.environ.get('WATCHMAN_PREFILTER_MIN_MATCH', '0.85'))
+    check_seconds: float = float(os.environ.get('WATCHMAN_PREFILTER_CHECK_SECONDS', '60'))
+    bucket: str = os.environ.get('WATCHMAN_PREFILTER_BUCKET', '')
+    if bucket:
+        snapshot = S3Snapshot(bucket, os.environ.get('WATCHMAN_PREFILTER_KEY', 'watchman/prefilter.idx'))
+        return Prefilter(snapshot.path, min_match, check_seconds, snapshot)
+    path: str = os.environ.get('WATCHMAN_PREFILTER_PATH', '')
+    if not path:
+        return None
+    return Prefilter(path, min_match, check_seconds)
+
+
+def read_names(path: str, column: int = None) -> list:
+    with open(path, newline='', encoding='utf-8', errors='replace') as file:
+        if column is None:
+            return [line.strip() for line in file if line.strip()]
+        return [row[column] for row in csv.reader(file) if len(row) > column and row[column].strip()]
+
+
+def build(names: list, path: str, empty_response: dict = None):
+    # Gera o snapshot em arquivo temporario e troca de uma vez, para leitores nunca
+    # verem um indice pela metade
+    tokens: list = sorted({token for name in names for token in name_tokens(name)}, key=lambda token: (len(token), token))
+    header: bytes = json.dumps({
+        'built_at': int(time.time()),
+        'names': len(names),
+        'empty_response': empty_response if empty_response is not None else EMPTY_RESPONSE
+    }).encode()
+    temporary: str = f'{path}.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, len(header)))
+        file.write(header)
+        file.write('\n'.join(tokens).encode())
+    os.replace(temporary, path)
+    return len(tokens)
+
+
+if __name__ == '__main__':
+    # Rodar junto com a atualizacao das listas do watchman: todas as listas que o
+    # /search consulta (SDN, nomes alternativos, DPL, BIS...) precisam entrar
+    parser = argparse.ArgumentParser(description='Gera o indice de pre-filtro do watchman')
+    parser.add_argument('output')
+    parser.add_argument('sources', nargs='+', help='arquivos com um nome por linha, ou CSV com --column')
+    parser.add_argument('--column', type=int, default=None, help='coluna do nome nos CSVs (sdn.csv do OFAC: 1)')
+    parser.add_argument('--empty-response', default=None, help='JSON de resposta vazia do watchman')
+    parser.add_argument('--bucket', default=None, help='publica o indice no S3 lido pelas Lambdas')
+    parser.add_argument('--key', default='watchman/prefilter.idx')
+    arguments = parser.parse_args()
+
+    all_names: list = [name for source in arguments.sources for name in read_names(source, arguments.column)]
+    empty: dict = None
+    if arguments.empty_response:
+        with open(arguments.empty_response) as empty_file:
+            empty = json.load(empty_file)
+    count: int = build(all_names, arguments.output, empty)
+    print(f'{len(all_names)} nomes, {count} tokens gravados em {arguments.output}')
+    if arguments.bucket:
+        import boto3
+        boto3.client('s3').upload_file(arguments.output, arguments.bucket, arguments.key)
+        print(f'Indice publicado em s3://{arguments.bucket}/{arguments.key}')
@@ -0,0 +1,45 @@
+import unicodedata
+from urllib.parse import urlencode
+
+# Parametros de nome do /search do watchman, que o proprio watchman normaliza
+# com LowerAndRemovePunctuation antes de comparar. fold aplica exatamente essa
+# normalizacao, entao o watchman recebe o mesmo texto que produziria sozinho, e
+# variacoes do mesmo nome caem na mesma chave de cache.
+NAME_PARAMS = frozenset(('q', 'name', 'altName'))
+# Campos de endereco o watchman so passa para caixa baixa e tira espacos das pontas
+ADDRESS_PARAMS = frozenset(('address', 'city', 'state', 'providence', 'zip', 'country'))
+
+# Unica pontuacao que o watchman trata: ponto e virgula somem, hifen vira espaco;
+# apostrofos e o resto ficam no token
+_PUNCTUATION = str.maketrans({'.': '', ',': '', '-': ' '})
+
+
+def fold(text) -> str:
+    # NFD, remove marcas combinantes (Mn), NFC e caixa baixa, como o watchman. Os
+    # espacos sao colapsados: o watchman separa os tokens por qualquer espaco.
+    decomposed: str = unicodedata.normalize('NFD', str(text))
+    stripped: str = unicodedata.normalize('NFC', ''.join(char for char in decomposed if unicodedata.category(char) != 'Mn'))
+    return ' '.join(stripped.lower().translate(_PUNCTUATION).split())
+
+
+def normalize(params: dict) -> tuple:
+    # Forma canonica da consulta: valores vazios descartados e pares ordenados
+    items: list = []
+    for key, value in (params or {}).items():
+        values = value if isinstance(value, list) else [value]
+        for item in values:
+            if item is None:
+                continue
+            if key in NAME_PARAMS:
+                item = fold(item)
+            elif key in ADDRESS_PARAMS:
+                item = str(item).strip().lower()
+            else:
+                item = str(item).strip()
+            if item:
+                items.append((key, item))
+    return tuple(sorted(items))
+
+
+def query_string(normalized: tuple) -> str:
+    return urlencode(normalized)
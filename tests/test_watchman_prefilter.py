@@ -0,0 +1,109 @@
+import os
+import random
+import string
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'watchman_handler'))
+
+import watchman_prefilter  # noqa: E402
+
+MIN_MATCH = 0.85
+
+NAMES = [
+    'DE LA CRUZ',
+    "AL QA'IDA",
+    'BANCO NACIONAL DE CUBA',
+    'KIM, Jong Un',
+    "O'BRIEN, Patrick",
+    'Jose Maria VAN DER BERG',
+    'ISLAMIC REVOLUTIONARY GUARD CORPS',
+    'Aleksandr Petrovich IVANOV',
+    'ABU BAKR AL-BAGHDADI',
+    'EL CHAPO GUZMAN LOERA'
+]
+
+
+def jaro_winkler(a: str, b: str) -> float:
+    # Referencia: Jaro-Winkler classico, prefixo de ate 4 letras com peso 0.1
+    if a == b:
+        return 1.0
+    window: int = max(max(len(a), len(b)) // 2 - 1, 0)
+    used: list = [False] * len(b)
+    left: list = []
+    for i, char in enumerate(a):
+        for j in range(max(0, i - window), min(len(b), i + window + 1)):
+            if not used[j] and b[j] == char:
+                used[j] = True
+                left.append(char)
+                break
+    if not left:
+        return 0.0
+    right: list = [char for j, char in enumerate(b) if used[j]]
+    transpositions: int = sum(x != y for x, y in zip(left, right)) // 2
+    matches: int = len(left)
+    jaro: float = (matches / len(a) + matches / len(b) + (matches - transpositions) / matches) / 3
+    prefix: int = 0
+    for x, y in zip(a[:4], b[:4]):
+        if x != y:
+            break
+        prefix += 1
+    return jaro + prefix * 0.1 * (1 - jaro)
+
+
+def best_pair(query: str, name: str) -> float:
+    # Limite do score do watchman: melhor par entre tokens e juncoes dos dois lados
+    query_tokens: set = watchman_prefilter.joins(query.split())
+    return max(jaro_winkler(x, y) for x in query_tokens for y in watchman_prefilter.name_tokens(name))
+
+
+def edit(text: str, rng: random.Random) -> str:
+    chars: list = list(text)
+    for _ in range(rng.randint(0, 2)):
+        position: int = rng.randrange(len(chars) + 1)
+        action: int = rng.randrange(3)
+        if action == 0:
+            chars.insert(position, rng.choice(string.ascii_lowercase))
+        elif action == 1 and position < len(chars):
+            del chars[position]
+        elif position < len(chars):
+            chars[position] = rng.choice(string.ascii_lowercase)
+    return ''.join(chars)
+
+
+@pytest.fixture(scope='module')
+def index(tmp_path_factory):
+    path: str = str(tmp_path_factory.mktemp('prefilter') / 'prefilter.idx')
+    watchman_prefilter.build(NAMES, path)
+    return watchman_prefilter.PrefilterIndex(path)
+
+
+@pytest.mark.parametrize('query', ['delacruz', 'alqaida', 'de la cruz', "o'brien patrick", 'jongun kim', 'vanderberg'])
+def test_joined_particles_are_forwarded(index, query):
+    assert index.possible_match(query, MIN_MATCH)
+
+
+def test_unrelated_name_is_rejected(index):
+    assert not index.possible_match('thomas hughes', MIN_MATCH)
+
+
+def test_never_rejects_what_reference_jaro_winkler_matches(index):
+    rng = random.Random(20261018)
+    queries: list = []
+    for name in NAMES:
+        tokens: list = watchman_prefilter.watchman_query.fold(name).split()
+        for _ in range(30):
+            start: int = rng.randrange(len(tokens))
+            piece: list = tokens[start:start + rng.randint(1, 3)]
+            queries.append(edit(rng.choice([' '.join(piece), ''.join(piece)]), rng))
+    queries += [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 12))) for _ in range(300)]
+
+    rejected: int = 0
+    for query in filter(str.strip, queries):
+        if index.possible_match(query, MIN_MATCH):
+            continue
+        rejected += 1
+        best: float = max(best_pair(query, name) for name in NAMES)
+        assert best < MIN_MATCH, f'{query!r} rejeitada com Jaro-Winkler {best:.3f}'
+    assert rejected
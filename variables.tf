@@ -45,4 +45,22 @@ variable "cognito_user_pool_id" {
 variable "cognito_client_id" {
   description = "Cognito client id"
   type = string
-}
\ No newline at end of file
+}
+
+variable "transactions_cache_table" {
+  description = "DynamoDB table shared by card_transactions_handler containers as response cache (empty disables)"
+  type = string
+  default = ""
+}
+
+variable "watchman_prefilter_bucket" {
+  description = "S3 bucket with the watchman prefilter index published by watchman_prefilter.py --bucket (empty disables; the VPC needs an S3 endpoint)"
+  type = string
+  default = ""
+}
+
+variable "watchman_prefilter_key" {
+  description = "Object key of the watchman prefilter index"
+  type = string
+  default = "watchman/prefilter.idx"
+}